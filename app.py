@@ -1,15 +1,42 @@
 import json
 from pathlib import Path
 from flask import Flask, render_template, request, jsonify, redirect, url_for
+import engine
+from engine import (CURRENCY_SYMBOL, UPGRADE_CITY, DEFAULT_CITY_PRICES_EU,
+                    DEFAULT_VOGN_SETTINGS, GameState, TradeError, iso_now)
+from history import GameHistory
+from memory import MemoryBudget, deep_size, process_rss, start_tracing_from_env, tracemalloc_summary
+from models import Catalog, Player
+from snapshot import EMPTY_SNAPSHOT, publish
 import copy
+import csv
+import functools
+import gc
 from datetime import datetime, timezone, timedelta
+import gzip
+import io
+import itertools
+import hashlib
 import os
 import re
+import threading
 
-app = Flask(__name__)
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
 
-CURRENCY_SYMBOL = "¥"
-UPGRADE_CITY = "Yamato værksted"
+try:
+    from flask_sock import Sock
+except ImportError:  # trades over plain HTTP only
+    Sock = None
+
+app = Flask(__name__)
 
 CITY_NAME_MAP = {
     "Laden": "Tokyo",
@@ -40,67 +67,9 @@ ITEM_NAME_MAP = {
 #  Default data for a fresh game
 # ---------------------------------------------------------------------
 BACKUP_FILE = Path("game_state.json")
-DEFAULT_CITY_PRICES_EU = {
-    "Tokyo": {
-        "Nudler": 900,
-        "Wasabi": 1400,
-        "Matcha": 2100,
-        "Kimonoer": 2400,
-        "Ramenkits": 3000,
-        "Sake": 4000,
-    },
-    "Osaka": {
-        "Nudler": 1100,
-        "Wasabi": 1600,
-        "Matcha": 2300,
-        "Kimonoer": 2700,
-        "Ramenkits": 3400,
-        "Sake": 4600,
-        "Tun": 5900,
-    },
-    "Kyoto": {
-        "Matcha": 2400,
-        "Kimonoer": 2600,
-        "Katanasværd": 7400,
-        "Bonsaitræer": 8800,
-        "Shinto-amuletter": 10800,
-        "Samurai-rustninger": 14700,
-    },
-    "Yokohama": {
-        "Nudler": 800,
-        "Ramenkits": 3300,
-        "Sake": 4400,
-        "Tun": 5700,
-        "Katanasværd": 7000,
-        "Bonsaitræer": 8500,
-    },
-    "Sapporo": {
-        "Wasabi": 1700,
-        "Matcha": 2000,
-        "Kimonoer": 2300,
-        "Sake": 3800,
-        "Tun": 5200,
-        "Katanasværd": 6500,
-    },
-    "Kobe": {
-        "Ramenkits": 3600,
-        "Sake": 4700,
-        "Tun": 6100,
-        "Bonsaitræer": 9000,
-        "Shinto-amuletter": 11000,
-        "Samurai-rustninger": 15000,
-    },
-    "Nagasaki": {
-        "Nudler": 1000,
-        "Wasabi": 1500,
-        "Matcha": 2200,
-        "Kimonoer": 2500,
-        "Ramenkits": 3100,
-        "Sake": 4100,
-        "Shinto-amuletter": 9300,
-    },
-    UPGRADE_CITY: {},
-}
+HISTORY_FILE = Path("game_history.ndjson")
+LOG_ARCHIVE_FILE = Path("game_log_archive.ndjson")   # ledger rows moved out of memory
+LOG_KEEP_ENTRIES = 2000                              # per player, under the hard budget
 # --- add near other defaults ---
 def parse_iso(ts: str) -> datetime:
     return datetime.fromisoformat(ts.replace("Z", "+00:00"))
@@ -169,25 +138,36 @@ DEFAULT_PLAYERS = {
     for i in range(1, 5)
 }
 
-DEFAULT_VOGN_SETTINGS = {
-    "start_cost": 5000,
-    "upgrade_step": 7500}
-
 # ---------------------------------------------------------------------
 #  Helper functions for persistence
 # ---------------------------------------------------------------------
 def next_upgrade_cost(capacity: int) -> int:
     """Return cost for upgrading capacity by one slot (not cumulative)."""
-    settings = globals().get("vogn_settings", DEFAULT_VOGN_SETTINGS)
-    start_cost = int(settings.get("start_cost", DEFAULT_VOGN_SETTINGS["start_cost"]))
-    upgrade_step = int(settings.get("upgrade_step", DEFAULT_VOGN_SETTINGS["upgrade_step"]))
-    if capacity < 2:
-        return start_cost
-    return start_cost + upgrade_step * (capacity - 2)
+    return engine.upgrade_cost(globals().get("vogn_settings", DEFAULT_VOGN_SETTINGS), capacity)
+
+
+def current_game() -> GameState:
+    """Wrap the live module state for the rules in engine.py."""
+    return GameState(players, city_prices, closed_cities, vogn_settings, catalog)
+
 
-def iso_now():
-    """UTC ISO-8601 timestamp, seconds only."""
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+def trade_error(err: TradeError):
+    """JSON reply for a refused trade."""
+    if err.status:
+        return jsonify(success=False, message=str(err), status=err.status)
+    return jsonify(success=False, message=str(err))
+
+
+def new_player() -> Player:
+    """Fresh player added mid-game, with an opening balance record."""
+    player = Player(10000, 2)
+    player.transaction_log.append({"ts": iso_now(), "money": player.money})
+    return player
+
+
+def build_players(players_data: dict) -> dict:
+    """JSON player dicts → ``{name: Player}`` using the shared catalog."""
+    return {name: Player.from_dict(p, catalog) for name, p in players_data.items()}
 
 
 def load_game_state():
@@ -209,6 +189,7 @@ def load_game_state():
     data.setdefault("breaking_news", "")
     data.setdefault("closed_cities", [])
     data.setdefault("vogn_settings", copy.deepcopy(DEFAULT_VOGN_SETTINGS))
+    data.setdefault("log_archive_batch", 0)
 
 
     for p in data["players"].values():
@@ -221,38 +202,189 @@ def load_game_state():
 
 def save_game_state():
     """Write *all* in-memory state to disk."""
+    write_state_file()
+    history.capture(history_state(), iso_now())
+    publish_snapshot()
+    if memory_budget.tick():
+        enforce_memory_budget()
+
+
+def write_state_file():
     with BACKUP_FILE.open("w") as f:
         json.dump(
             {
-                "players": players,
+                "players": {name: p.to_dict(catalog) for name, p in players.items()},
                 "selected_city": selected_city,
                 "selected_player": selected_player,
                 "city_prices": city_prices,
                 "breaking_news": breaking_news,
                 "closed_cities": closed_cities,
                 "vogn_settings": vogn_settings,
+                "log_archive_batch": log_archive_batch,
             },
             f,
             indent=2,
         )
 
 
+def history_state() -> dict:
+    """The slice of state recorded in the event history (see history.py)."""
+    return {
+        "players": {
+            name: {"money": p.money, "capacity": p.capacity, "cargo": p.cargo_names(catalog)}
+            for name, p in players.items()
+        },
+        "city_prices": {city: dict(goods) for city, goods in city_prices.items()},
+        "closed_cities": list(closed_cities),
+    }
+
+
 # ---------------------------------------------------------------------
 #  In-memory copies (Flask will mutate these)
 # ---------------------------------------------------------------------
 _state = load_game_state()
-players         = _state["players"]
+catalog = Catalog()
+catalog.add_prices(DEFAULT_CITY_PRICES_EU)
+catalog.add_prices(_state["city_prices"])
+players         = build_players(_state["players"])
 selected_city   = _state["selected_city"]
 selected_player = _state["selected_player"]
 city_prices     = _state["city_prices"]
 breaking_news   = _state["breaking_news"]
 closed_cities   = _state["closed_cities"]
 vogn_settings   = _state["vogn_settings"]
+log_archive_batch = _state["log_archive_batch"]   # last archive batch the save file knows
+
+# Event history with checkpoints for "what did the game look like at …?"
+history = GameHistory(HISTORY_FILE)
+
+# Memory budgets from MEMORY_SOFT_LIMIT_MB / MEMORY_HARD_LIMIT_MB (see memory.py)
+start_tracing_from_env()
+memory_budget = MemoryBudget.from_env()
+
+# ---------------------------------------------------------------------
+#  Concurrency: writers serialize on a lock, readers use snapshots
+# ---------------------------------------------------------------------
+state_lock = threading.RLock()
+_snapshot = EMPTY_SNAPSHOT
+
+
+def publish_snapshot():
+    """Publish the current state for lock-free readers (see snapshot.py)."""
+    global _snapshot
+    _snapshot = publish(_snapshot, players, city_prices, closed_cities,
+                        selected_city, vogn_settings, catalog)
+
+
+def current_snapshot():
+    """Latest published, immutable view of the game state."""
+    return _snapshot
+
+
+def writes_state(view):
+    """Run a state-changing route under the write lock."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with state_lock:
+            return view(*args, **kwargs)
+    return wrapper
+
+
+publish_snapshot()
 
 # Convenience list for the dropdown
 cities = list(city_prices.keys())
 
 
+# ---------------------------------------------------------------------
+#  Response helpers: fast JSON, compression and static fingerprints
+# ---------------------------------------------------------------------
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html"}
+COMPRESS_MIN_SIZE = 500                 # bytes; tiny bodies aren't worth it
+STATIC_MAX_AGE = 365 * 24 * 60 * 60     # fingerprinted assets never change
+_static_hashes = {}                     # {filename: (mtime_ns, digest)}
+
+
+def dumps_fast(payload) -> bytes:
+    """Serialize *payload* with orjson when installed, else stdlib json."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_jsonify(payload):
+    """Drop-in for ``jsonify`` on the large, frequently polled endpoints."""
+    return app.response_class(dumps_fast(payload), mimetype="application/json")
+
+
+def static_fingerprint(filename: str):
+    """Short content hash of a file in ``static/`` (cached until it changes)."""
+    path = Path(app.static_folder) / filename
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    cached = _static_hashes.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+    _static_hashes[filename] = (mtime, digest)
+    return digest
+
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """``url_for('static', ...)`` → ``/static/style.css?v=<content hash>``."""
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        digest = static_fingerprint(values["filename"])
+        if digest:
+            values["v"] = digest
+
+
+def compress_response(response):
+    """Brotli/gzip-encode HTML and JSON bodies when the client accepts it."""
+    if (response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        encoding = "br"
+    elif accepted["gzip"]:
+        encoding = "gzip"
+    else:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == "br":
+        body = brotli.compress(body, quality=5)
+    else:
+        body = gzip.compress(body, compresslevel=6)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@app.after_request
+def finalize_response(response):
+    # Fingerprinted static files: cache for a year, never revalidate
+    if request.endpoint == "static":
+        filename = (request.view_args or {}).get("filename")
+        version = request.args.get("v")
+        if response.status_code == 200 and version and version == static_fingerprint(filename):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+    return compress_response(response)
+
+
 
 
 
@@ -260,114 +392,74 @@ cities = list(city_prices.keys())
 def index():
     player_data = players[selected_player]
     items = city_prices[selected_city]
+    snap = current_snapshot()     # roster and city status without the write lock
     return render_template(
         'index.html',
         items=items,
-        cargo=player_data['cargo'],
-        money=player_data['money'],
+        cargo=player_data.cargo_names(catalog),
+        money=player_data.money,
         cities=cities,
         selected_city=selected_city,
-        log=player_data['transaction_log'],
-        players=players.keys(),
+        log=player_data.transaction_log,
+        players=snap.players.keys(),
         selected_player=selected_player,
         breaking_news=breaking_news,  # Pass breaking news to the front end
-        closed_cities=closed_cities,
-        capacity=player_data['capacity'],          # NEW
-        upgrade_cost=next_upgrade_cost(player_data['capacity']),  # NEW
+        closed_cities=snap.closed_cities,
+        capacity=player_data.capacity,          # NEW
+        upgrade_cost=next_upgrade_cost(player_data.capacity),  # NEW
         is_upgrade_city=(selected_city == UPGRADE_CITY),
+        trade_socket=Sock is not None,
     )
 
 
 @app.route('/prices')
 def price_overview():
     """Show all cities with their available goods and prices."""
+    snap = current_snapshot()
     return render_template(
         'prices.html',
-        city_prices=city_prices,
-        closed_cities=closed_cities,
+        city_prices=snap.city_prices,
+        closed_cities=snap.closed_cities,
     )
 
-@app.route('/buy', methods=['POST'])
+def slot_index(space) -> int:
+    """1-based slot number from a form field → 0-based index (-1 if invalid)."""
+    return int(space) - 1 if space and space.isdigit() else -1
 
+
+@app.route('/buy', methods=['POST'])
+@writes_state
 def buy():
     global selected_player
     # Allow client to explicitly state which player is performing the buy
     player_name = request.form.get('player')
     if player_name and player_name in players:
         selected_player = player_name
-    player_data = players[selected_player]
-    if selected_city in closed_cities:
-        return jsonify(success=False, message=f"{selected_city} er lukket lige nu.")
-    if player_data["cargo"].count("") == 0:
-        return jsonify(success=False, message="Alle lastrum er fyldt. Overvej en opgradering.")
-
-    item = request.form.get('item')
-    items = city_prices[selected_city]
-
-    if item in items:
-        # Find the first empty cargo space (lowest index)
-        for i in range(len(player_data['cargo'])):
-            if not player_data['cargo'][i]:  # If the space is empty
-                item_price = items[item]
-                # Ensure the user has enough money to buy the item
-                if player_data['money'] >= item_price:
-                    player_data['cargo'][i] = item  # Place the item in the empty space
-                    player_data['money'] -= item_price
-                    # after you charge the player’s money …
-                    player_data['transaction_log'].append(
-                        f"Købte {item} for {CURRENCY_SYMBOL}{item_price} i {selected_city}."
-                    )
-                    player_data['transaction_log'].append(
-                        {"ts": iso_now(), "money": player_data["money"]}
-                    )
-
-                    save_game_state()  # Save game state after the buy action
-                    return jsonify(success=True, selected_player=selected_player)  # Return a success response
-                else:
-                    return jsonify(success=False, message="Du har ikke yen nok.")
-        else:
-                    return jsonify(success=False, message="Der er ingen tomme lastrum.")
-
-    return jsonify(success=False, message="Varen blev ikke fundet.")
+    try:
+        engine.buy(current_game(), selected_player, selected_city, request.form.get('item'))
+    except TradeError as err:
+        return trade_error(err)
+    save_game_state()  # Save game state after the buy action
+    return jsonify(success=True, selected_player=selected_player)
 
 @app.route('/sell', methods=['POST'])
-
+@writes_state
 def sell():
     global selected_player
     # Allow client to explicitly state which player is performing the sell
     player_name = request.form.get('player')
     if player_name and player_name in players:
         selected_player = player_name
-    player_data = players[selected_player]
-    if selected_city in closed_cities:
-        return jsonify(success=False, message=f"{selected_city} er lukket lige nu.")
-    space = request.form.get('space')
-    items = city_prices[selected_city]
-
-    if space.isdigit():
-        space_index = int(space) - 1
-        if 0 <= space_index < len(player_data['cargo']):
-            if player_data['cargo'][space_index]:
-                item = player_data['cargo'][space_index]
-                if item in items:
-                    item_price = items[item]
-                    player_data['cargo'][space_index] = ''
-                    player_data['money'] += item_price
-                    player_data['transaction_log'].append(
-                        f"Solgte {item} for {CURRENCY_SYMBOL}{item_price} i {selected_city}."
-                    )
-                    player_data['transaction_log'].append(
-                        {"ts": iso_now(), "money": player_data["money"]}
-                    )
-
-                    save_game_state()  # Save game state after the sell action
-                    return jsonify(success=True, selected_player=selected_player)  # Return success response after selling
-                else:
-                    return jsonify(success=False, message=f"{selected_city} efterspørger ikke {item}.", status=400)
-
-    return jsonify(success=False, message="Ugyldig lasteplads.")
+    try:
+        engine.sell(current_game(), selected_player, selected_city,
+                    slot_index(request.form.get('space')))
+    except TradeError as err:
+        return trade_error(err)
+    save_game_state()  # Save game state after the sell action
+    return jsonify(success=True, selected_player=selected_player)
 
 @app.route('/clear', methods=['POST'])
+@writes_state
 def clear():
     global selected_player
     # Allow client to explicitly state which player is performing the clear
@@ -375,19 +467,18 @@ def clear():
     if player_name not in players:
         player_name = selected_player
     selected_player = player_name
-    player_data = players[selected_player]
-
-    space = request.form.get('space')
 
-    if space.isdigit():
-        space_index = int(space) - 1
-        if 0 <= space_index < len(player_data['cargo']):
-            player_data['cargo'][space_index] = ''  # Clear the cargo space
-            save_game_state()  # Save game state after clearing
+    try:
+        engine.clear(current_game(), selected_player, slot_index(request.form.get('space')))
+    except TradeError:
+        pass                    # nothing to clear – still reported as success
+    else:
+        save_game_state()  # Save game state after clearing
 
     return jsonify(success=True, selected_player=selected_player)  # Return success response after clearing
 
 @app.route('/set_city', methods=['POST'])
+@writes_state
 def set_city():
     global selected_city
     selected_city = request.form.get('city')  # Update the selected city
@@ -396,6 +487,7 @@ def set_city():
     return redirect(url_for('player_page', player_name=player))
 
 @app.route('/set_player', methods=['POST'])
+@writes_state
 def set_player():
     global selected_player
     selected_player = request.form.get('player')  # Update the selected player
@@ -410,20 +502,43 @@ def admin():
     if request.method == 'POST':
         chosen = request.form.get('city')
         if chosen in city_prices:
-            selected_city = chosen
-            save_game_state()
+            with state_lock:
+                selected_city = chosen
+                save_game_state()
 
+    snap = current_snapshot()
     return render_template(
         'admin.html',
         cities=cities,
-        city_prices=city_prices,
+        city_prices=snap.city_prices,
         breaking_news=breaking_news,
-        closed_cities=closed_cities,
-        players=players,
-        selected_city=selected_city,  # ← pass it to the template
-        vogn_settings=vogn_settings,
+        closed_cities=snap.closed_cities,
+        players=snap.players,
+        selected_city=snap.selected_city,  # ← pass it to the template
+        vogn_settings=snap.vogn_settings,
     )
+@app.route('/admin/city', methods=['POST'])
+@writes_state
+def admin_select_city():
+    """Select a city from the admin page and return just its price editor."""
+    global selected_city
+    chosen = request.form.get('city')
+    if chosen not in city_prices:
+        return jsonify(error=f"unknown city: {chosen}"), 400
+    selected_city = chosen
+    save_game_state()
+
+    snap = current_snapshot()
+    return render_template(
+        '_price_editor.html',
+        city_prices=snap.city_prices,
+        selected_city=snap.selected_city,
+        vogn_settings=snap.vogn_settings,
+    )
+
+
 @app.route('/update_prices', methods=['POST'])
+@writes_state
 def update_prices():
     city = request.form.get('city')
     
@@ -449,6 +564,7 @@ def update_prices():
 
 
 @app.route('/update_vogn_settings', methods=['POST'])
+@writes_state
 def update_vogn_settings():
     global vogn_settings
     start_raw = (request.form.get('start_cost') or '').strip()
@@ -467,6 +583,7 @@ def update_vogn_settings():
 
 
 @app.route('/push_news', methods=['POST'])
+@writes_state
 def push_news():
     news_message = request.form.get('news_message')
     # You can store this message in a global variable, or integrate a notification system
@@ -484,6 +601,7 @@ def push_news():
 
 
 @app.route('/update_city_status', methods=['POST'])
+@writes_state
 def update_city_status():
     global closed_cities
     # Flask builds a list containing the value for every checked box
@@ -499,25 +617,191 @@ def update_city_status():
 #  Adjust player balances (admin only)
 # ------------------------------------------------------------------
 @app.route('/adjust_money', methods=['POST'])
+@writes_state
 def adjust_money():
     # Every input uses the player-name as its field name
+    game = current_game()
     for player_name, delta_str in request.form.items():
         try:
             delta = int(delta_str)
         except ValueError:
             continue            # ignore blanks / bad input
-        players[player_name]['money'] += delta
-        # optional audit log:
-        players[player_name]['transaction_log'].append(
-            f"Adminjustering: {CURRENCY_SYMBOL}{delta:+d}"
-        )
-        players[player_name]['transaction_log'].append(
-            {"ts": iso_now(), "money": players[player_name]['money']}
-        )
-        save_game_state()
+        engine.adjust(game, player_name, delta)
+    save_game_state()
     return redirect(url_for('admin'))
 
+
+# ------------------------------------------------------------------
+#  Batch admin operations – validate everything, apply, save once
+# ------------------------------------------------------------------
+BATCH_OPS = {"price", "money", "open", "close",
+             "add_player", "rename_player", "delete_player"}
+
+
+def parse_batch_request():
+    """
+    Return the list of operation dicts sent to /admin/batch.
+
+    Accepts a JSON list (or ``{"operations": [...]}``), a ``text/csv`` body,
+    or a CSV upload / textarea in the form fields ``file`` / ``csv``.
+    CSV files need a header row using the same keys as the JSON
+    operations: ``op,city,item,price,player,delta,new_name``.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get("operations")
+        return data if isinstance(data, list) else None
+
+    if request.mimetype == "text/csv":
+        text = request.get_data(as_text=True)
+    elif "file" in request.files:
+        text = request.files["file"].read().decode("utf-8-sig")
+    else:
+        text = request.form.get("csv")
+    if text is None:
+        return None
+    return [
+        {key.strip(): value.strip() for key, value in row.items()
+         if key and value is not None and value.strip()}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+def validate_batch(operations):
+    """
+    Check every operation against the state it will see when applied in
+    order (renames and deletes affect later rows).  Returns a list of
+    normalised operations and a list of error strings.
+    """
+    names = set(players)
+    errors = []
+    planned = []
+    for row, op in enumerate(operations, start=1):
+        if not isinstance(op, dict) or op.get("op") not in BATCH_OPS:
+            errors.append(f"Row {row}: unknown operation {op!r}")
+            continue
+        kind = op["op"]
+        city = op.get("city") if isinstance(op.get("city"), str) else None
+        player = str(op.get("player", "")).strip()
+
+        if kind == "price":
+            item = op.get("item") if isinstance(op.get("item"), str) else None
+            if city not in city_prices:
+                errors.append(f"Row {row}: unknown city {city!r}")
+            elif item not in city_prices[city]:
+                errors.append(f"Row {row}: {city} does not trade {item!r}")
+            else:
+                try:
+                    price = int(op.get("price"))
+                except (TypeError, ValueError):
+                    errors.append(f"Row {row}: invalid price for {item}")
+                    continue
+                if price < 0:
+                    errors.append(f"Row {row}: price for {item} must not be negative")
+                    continue
+                planned.append({"op": kind, "city": city, "item": item, "price": price})
+
+        elif kind in ("open", "close"):
+            if city not in city_prices:
+                errors.append(f"Row {row}: unknown city {city!r}")
+            elif kind == "close" and city == UPGRADE_CITY:
+                errors.append(f"Row {row}: {UPGRADE_CITY} cannot be closed")
+            else:
+                planned.append({"op": kind, "city": city})
+
+        elif kind == "money":
+            if player not in names:
+                errors.append(f"Row {row}: unknown player {player!r}")
+                continue
+            try:
+                delta = int(op.get("delta"))
+            except (TypeError, ValueError):
+                errors.append(f"Row {row}: invalid amount for {player}")
+                continue
+            planned.append({"op": kind, "player": player, "delta": delta})
+
+        elif kind == "add_player":
+            if not player or player in names:
+                errors.append(f"Row {row}: cannot add player {player!r}")
+                continue
+            names.add(player)
+            planned.append({"op": kind, "player": player})
+
+        elif kind == "rename_player":
+            new_name = str(op.get("new_name", "")).strip()
+            if player not in names:
+                errors.append(f"Row {row}: unknown player {player!r}")
+            elif not new_name or new_name in names:
+                errors.append(f"Row {row}: cannot rename {player} to {new_name!r}")
+            else:
+                names.discard(player)
+                names.add(new_name)
+                planned.append({"op": kind, "player": player, "new_name": new_name})
+
+        elif kind == "delete_player":
+            if player not in names:
+                errors.append(f"Row {row}: unknown player {player!r}")
+                continue
+            names.discard(player)
+            planned.append({"op": kind, "player": player})
+    return planned, errors
+
+
+def apply_batch(planned):
+    """Apply already validated operations in order. Cannot fail halfway."""
+    global selected_player, closed_cities
+    closed = list(closed_cities)
+    relabel = {}                # archived ledger name → name after the batch
+    now = iso_now()
+    game = GameState(players, city_prices, closed, vogn_settings, catalog,
+                     clock=lambda: now)
+    for op in planned:
+        kind = op["op"]
+        if kind == "price":
+            city_prices[op["city"]][op["item"]] = op["price"]
+        elif kind == "close":
+            if op["city"] not in closed:
+                closed.append(op["city"])
+        elif kind == "open":
+            if op["city"] in closed:
+                closed.remove(op["city"])
+        elif kind == "money":
+            engine.adjust(game, op["player"], op["delta"])
+        elif kind == "add_player":
+            players[op["player"]] = new_player()
+        elif kind == "rename_player":
+            players[op["new_name"]] = players.pop(op["player"])
+            if selected_player == op["player"]:
+                selected_player = op["new_name"]
+            follow_rename(relabel, op["player"], op["new_name"])
+        elif kind == "delete_player":
+            players.pop(op["player"])
+            if selected_player == op["player"]:
+                selected_player = next(iter(players), '')
+            follow_rename(relabel, op["player"], deleted_label(op["player"]))
+    closed_cities = closed
+    relabel_archived_rows(relabel)
+
+
+@app.route('/admin/batch', methods=['POST'])
+@writes_state
+def admin_batch():
+    """Apply many admin changes atomically with a single save."""
+    operations = parse_batch_request()
+    if operations is None:
+        return jsonify(success=False, errors=["No operations provided."]), 400
+
+    planned, errors = validate_batch(operations)
+    if errors:
+        return jsonify(success=False, errors=errors), 400
+
+    apply_batch(planned)
+    save_game_state()
+    return jsonify(success=True, applied=len(planned))
+
 @app.route('/upgrade_truck', methods=['POST'])
+@writes_state
 def upgrade_truck():
     # Ensure the performing player is respected
     global selected_player
@@ -526,22 +810,10 @@ def upgrade_truck():
         player_name = selected_player
     selected_player = player_name
 
-    if selected_city != UPGRADE_CITY:
-        return jsonify(success=False, message=f"Opgraderinger kan kun købes i {UPGRADE_CITY}.")
-    player = players[selected_player]
-    cost = next_upgrade_cost(player["capacity"])
-    if player["money"] < cost:
-        return jsonify(success=False, message="Du har ikke yen nok til opgraderingen.")
-    # Perform upgrade
-    player["money"]   -= cost
-    player["capacity"] += 1
-    player["cargo"].append("")            # new empty slot
-    player["transaction_log"].append(
-        f"Opgraderede lastvognen til {player['capacity']} pladser for {CURRENCY_SYMBOL}{cost}."
-    )
-    player["transaction_log"].append(
-        {"ts": iso_now(), "money": player["money"]}
-    )
+    try:
+        engine.upgrade(current_game(), selected_player, selected_city)
+    except TradeError as err:
+        return trade_error(err)
     save_game_state()
     return jsonify(success=True)
     # ------------------------------------------------------------------
@@ -552,22 +824,113 @@ def upgrade_truck():
         # Always save the current selected_player after each request
         save_game_state()
         return response
+
+
+# ------------------------------------------------------------------
+#  WebSocket trading: one socket per player page, replies are diffs
+# ------------------------------------------------------------------
+WS_OPS = {"buy", "sell", "clear", "upgrade"}
+
+
+def handle_ws_command(player_name: str, msg: dict) -> dict:
+    """
+    Run one trade command from the socket and describe what changed.
+
+    *msg* is ``{"op": "buy"|"sell"|"clear"|"upgrade", "item": ..., "space":
+    <1-based slot>, "id": <echoed back>}``.  A successful reply carries only
+    what the page has to patch: ``money``, ``slots`` ({"<slot>": item, ""
+    when empty}), ``log`` (new text lines) and, after an upgrade, ``capacity``
+    and ``upgrade_cost``.  Refusals reply ``{"ok": false, "message": ...}``.
+    """
+    global selected_player
+    reply = {"id": msg.get("id")}
+    op = msg.get("op")
+    if op not in WS_OPS:
+        return {**reply, "ok": False, "message": "Ukendt handling."}
+    item, space = msg.get("item"), msg.get("space", "")
+    if (op == "buy" and not isinstance(item, str)) or not (
+            isinstance(space, str) or (isinstance(space, int) and not isinstance(space, bool))):
+        return {**reply, "ok": False, "message": "Ugyldig besked."}
+    with state_lock:
+        if player_name not in players:
+            return {**reply, "ok": False, "message": f"Ukendt spiller: {player_name}"}
+        selected_player = player_name
+        player = players[player_name]
+        money, capacity = player.money, player.capacity
+        cargo, log_length = player.cargo_names(catalog), len(player.transaction_log)
+
+        slot = slot_index(str(space))
+        try:
+            if op == "buy":
+                engine.buy(current_game(), player_name, selected_city, item)
+            elif op == "sell":
+                engine.sell(current_game(), player_name, selected_city, slot)
+            elif op == "clear":
+                engine.clear(current_game(), player_name, slot)
+            else:
+                engine.upgrade(current_game(), player_name, selected_city)
+        except TradeError as err:
+            if op == "clear":
+                return {**reply, "ok": True}   # nothing to clear, as over HTTP
+            return {**reply, "ok": False, "message": str(err)}
+        save_game_state()
+
+        reply.update(ok=True, money=player.money)
+        new_cargo = player.cargo_names(catalog)
+        reply["slots"] = {
+            str(i + 1): item for i, item in enumerate(new_cargo)
+            if i >= len(cargo) or cargo[i] != item
+        }
+        reply["log"] = [e for e in player.transaction_log[log_length:] if isinstance(e, str)]
+        if player.capacity != capacity:
+            reply["capacity"] = player.capacity
+            reply["upgrade_cost"] = next_upgrade_cost(player.capacity)
+    return reply
+
+
+def ws_session(ws, player_name: str) -> None:
+    """Serve trade commands on *ws* until the browser goes away."""
+    while True:
+        raw = ws.receive()
+        if raw is None:
+            break
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            msg = None
+        if not isinstance(msg, dict):
+            ws.send(dumps_fast({"ok": False, "message": "Ugyldig besked."}).decode())
+            continue
+        ws.send(dumps_fast(handle_ws_command(player_name, msg)).decode())
+
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws/<player_name>')
+    def trade_socket(ws, player_name):
+        ws_session(ws, player_name)
+
+
 # ------------------------------------------------------------------
 #  Hard reset – starts a brand-new game with default data
 # ------------------------------------------------------------------
 @app.route('/reset_game', methods=['POST'])
+@writes_state
 def reset_game():
     global players, selected_city, selected_player
     global city_prices, breaking_news, closed_cities, vogn_settings
 
     # Fresh deep copies so we don't accidentally share state
-    players         = copy.deepcopy(DEFAULT_PLAYERS)
+    players         = build_players(copy.deepcopy(DEFAULT_PLAYERS))
     selected_city   = next(iter(DEFAULT_CITY_PRICES_EU))
     selected_player = "Player 1"
     city_prices     = copy.deepcopy(DEFAULT_CITY_PRICES_EU)
     breaking_news   = ""
     closed_cities   = []
     vogn_settings   = copy.deepcopy(DEFAULT_VOGN_SETTINGS)
+    if LOG_ARCHIVE_FILE.exists():
+        LOG_ARCHIVE_FILE.unlink()   # archived rows belong to the old game
 
     save_game_state()
     return redirect(url_for('admin'))
@@ -581,6 +944,81 @@ def get_breaking_news():
 def iso_minute(dt: datetime) -> str:
     return dt.replace(second=0, microsecond=0).isoformat().replace("+00:00", "Z")
 
+
+def scan_log(log, count: int, sales_since: datetime = None):
+    """
+    One pass over the first *count* entries of a transaction log.
+
+    Returns ``(buckets, sales, text_entries)``: minute → last balance in that
+    minute, ``(city, item)`` for every sale at or after *sales_since* (a
+    'Solgte …' line timed by the record that follows it), and the number
+    of text entries.  Shared by the charts and the admin dashboard.
+    """
+    buckets, sales, text_entries = {}, [], 0
+    for i in range(count):
+        entry = log[i]
+        if isinstance(entry, dict):
+            try:
+                t = parse_iso(entry["ts"])
+            except Exception:
+                continue
+            buckets[t.replace(second=0, microsecond=0)] = entry["money"]  # last value in that minute wins
+        elif isinstance(entry, str):
+            text_entries += 1
+            if sales_since is None:
+                continue
+            m = SELL_RE.match(entry.strip())
+            if m and i + 1 < count and isinstance(log[i + 1], dict):
+                try:
+                    ts = parse_iso(log[i + 1].get("ts") or "")
+                except Exception:
+                    continue
+                if ts >= sales_since:
+                    sales.append((m.group("city") or "Unknown", m.group("item") or "Unknown"))
+    return buckets, sales, text_entries
+
+
+def fill_series(buckets: dict, start: datetime, now: datetime) -> list:
+    """Minute-by-minute ``[iso, balance]`` points, filled forward."""
+    # Start from the last known balance BEFORE the window; otherwise leave undefined
+    last_val = None
+    before = [t for t in buckets if t < start]
+    if before:
+        last_val = buckets[max(before)]
+
+    # Build minute-by-minute series; no prefill if no prior value
+    pts = []
+    t = start
+    while t <= now:
+        if t in buckets:
+            last_val = buckets[t]
+        # Append None (→ null in JSON) until we have the first known value
+        pts.append([iso_minute(t), last_val])
+        t += timedelta(minutes=1)
+    return pts
+
+
+def summarize_sales(sales, hours) -> dict:
+    """Popularity payload from ``(city, item)`` sale tuples."""
+    per_city = {}   # {city: {item: count}}
+    total    = {}   # {item: count}
+    for city, item in sales:
+        per_city.setdefault(city, {}).setdefault(item, 0)
+        per_city[city][item] += 1
+        total.setdefault(item, 0)
+        total[item] += 1
+
+    def top_list(d: dict, k: int):
+        return sorted(([k_, v] for k_, v in d.items()), key=lambda x: (-x[1], x[0]))[:k]
+
+    return {
+        "window_hours": hours,
+        "per_city": per_city,
+        "top_per_city": {c: top_list(items, 3) for c, items in per_city.items()},
+        "top_global": top_list(total, 10),
+        "cities": list(per_city.keys()),
+    }
+
 @app.route('/money_series')
 def money_series():
     """
@@ -597,46 +1035,380 @@ def money_series():
     now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
     start = now - timedelta(hours=hours)
 
-    def iso_minute(dt: datetime) -> str:
-        return dt.replace(second=0, microsecond=0).isoformat().replace("+00:00", "Z")
-
     series = {}
-    for name, pdata in players.items():
-        # Collect minute → money snapshots from the log
-        buckets = {}
-        for rec in pdata.get("transaction_log", []):
-            if not isinstance(rec, dict):
-                continue  # skip legacy string entries
+    for name, view in current_snapshot().players.items():
+        buckets, _, _ = scan_log(view.log, view.log_length)
+        series[name] = fill_series(buckets, start, now)
+
+    resp = fast_jsonify(series)
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["Pragma"] = "no-cache"
+    return resp
+
+
+def normalize_ts(raw: str) -> str:
+    """Any ISO-8601 timestamp → the UTC, seconds-only form iso_now() writes."""
+    when = parse_iso(raw)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc).replace(microsecond=0).isoformat()
+
+
+@app.route('/admin/state_at')
+def state_at():
+    """
+    Rebuild balances, cargo, prices and closed cities at a past moment.
+    Query params: ?ts=2024-05-01T14:32:00Z  (&player=Name to narrow down)
+    Cost is bounded: one checkpoint copy plus at most one interval of events.
+    """
+    try:
+        ts = normalize_ts(request.args.get("ts", ""))
+    except ValueError:
+        return jsonify(error="ts must be an ISO-8601 timestamp"), 400
+
+    found = history.state_at(ts)
+    if found is None:
+        return jsonify(error="No history recorded before that time"), 404
+    state, checkpoint_ts, replayed = found
+
+    player = request.args.get("player")
+    if player:
+        if player not in state["players"]:
+            return jsonify(error=f"Unknown player at that time: {player}"), 404
+        state["players"] = {player: state["players"][player]}
+
+    resp = fast_jsonify({
+        "ts": ts,
+        "checkpoint_ts": checkpoint_ts,
+        "replayed_events": replayed,
+        "state": state,
+    })
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+# ------------------------------------------------------------------
+#  Streaming ledger export (NDJSON / CSV)
+# ------------------------------------------------------------------
+EXPORT_FIELDS = ["player", "ts", "money", "entry"]
+EXPORT_CHUNK_ROWS = 500
+
+
+def ledger_rows(name, log, count):
+    """
+    Yield ``(player, ts, money, entry)`` for the first *count* log entries.
+
+    A text entry is paired with the ``{"ts", "money"}`` record that follows
+    it; stand-alone records (e.g. a new player's opening balance) have no
+    text and legacy text without a record has no timestamp.
+    """
+    i = 0
+    while i < count:
+        entry = log[i]
+        text, rec = "", None
+        if isinstance(entry, str):
+            text = entry
+            if i + 1 < count and isinstance(log[i + 1], dict):
+                rec = log[i + 1]
+                i += 1
+        elif isinstance(entry, dict):
+            rec = entry
+        i += 1
+        yield name, rec.get("ts") if rec else None, rec.get("money") if rec else None, text
+
+
+def open_archive():
+    """
+    ``(file, size)`` of LOG_ARCHIVE_FILE, or ``None`` if there is none yet.
+    Take it together with the snapshot (under ``state_lock``): rows archived
+    later are still in that snapshot's logs and must not be read twice.
+    """
+    try:
+        f = LOG_ARCHIVE_FILE.open("rb")
+    except FileNotFoundError:
+        return None
+    return f, os.fstat(f.fileno()).st_size
+
+
+def archived_ledger_rows(archive, names=None):
+    """
+    Rows moved to LOG_ARCHIVE_FILE by ``archive_transaction_logs``, up to
+    the size noted by ``open_archive``, for the players in *names* – or all
+    of them, including deleted players.
+    """
+    if archive is None:
+        return
+    f, size = archive
+    wanted = set(names) if names is not None else None
+    with f:
+        while f.tell() < size:
+            line = f.readline()
+            if not line:
+                break
             try:
-                t = datetime.fromisoformat(rec["ts"].replace("Z", "+00:00"))
-            except Exception:
+                row = json.loads(line)
+            except ValueError:
+                continue            # torn last line after a crash
+            if wanted is None or row.get("player") in wanted:
+                yield row["player"], row.get("ts"), row.get("money"), row.get("entry", "")
+
+
+def iter_ledger(snap, names=None, start=None, end=None, archive=None):
+    """
+    Yield ``(player, ts, money, entry)`` for every logged transaction of
+    *names* (default: everyone), rows from *archive* (see ``open_archive``)
+    first.  Logs are read from the snapshot *snap*, so trades made
+    meanwhile never disturb the export.
+    """
+    live = (ledger_rows(name, snap.players[name].log, snap.players[name].log_length)
+            for name in (names if names is not None else snap.players) if name in snap.players)
+    for row in itertools.chain(archived_ledger_rows(archive, names), *live):
+        ts = row[1]
+        if start or end:
+            if ts is None or (start and ts < start) or (end and ts > end):
+                continue
+        yield row
+
+
+def ndjson_chunks(rows):
+    buf = []
+    for player, ts, money, entry in rows:
+        buf.append(dumps_fast({"player": player, "ts": ts, "money": money, "entry": entry}))
+        if len(buf) >= EXPORT_CHUNK_ROWS:
+            yield b"\n".join(buf) + b"\n"
+            buf = []
+    if buf:
+        yield b"\n".join(buf) + b"\n"
+
+
+def csv_chunks(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue()
+
+
+@app.route('/admin/export')
+def export_ledger():
+    """
+    Stream every player's transactions without building them in memory.
+    Query params: ?format=ndjson|csv  &player=Name (repeatable)
+                  &start=<ISO ts>  &end=<ISO ts>
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify(error="format must be ndjson or csv"), 400
+    try:
+        start = normalize_ts(request.args["start"]) if request.args.get("start") else None
+        end = normalize_ts(request.args["end"]) if request.args.get("end") else None
+    except ValueError:
+        return jsonify(error="start/end must be ISO-8601 timestamps"), 400
+    with state_lock:    # archiving moves rows out of the logs and into the file together
+        snap = current_snapshot()
+        archive = open_archive()
+    names = request.args.getlist("player") or None
+
+    rows = iter_ledger(snap, names, start, end, archive)
+    if fmt == "csv":
+        body, mimetype = csv_chunks(rows), "text/csv"
+    else:
+        body, mimetype = ndjson_chunks(rows), "application/x-ndjson"
+    resp = app.response_class(body, mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f"attachment; filename=truckerspil-ledger.{fmt}"
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
+# ------------------------------------------------------------------
+#  Memory budget: shed caches first, then move old log entries to disk
+# ------------------------------------------------------------------
+def archive_transaction_logs(keep: int = None) -> int:
+    """
+    Move all but the newest *keep* (default LOG_KEEP_ENTRIES) entries of
+    every transaction log to LOG_ARCHIVE_FILE.  ``/admin/export`` still includes them; the charts
+    only look at recent entries anyway.  Returns the number of entries moved.
+    """
+    global log_archive_batch
+    keep = LOG_KEEP_ENTRIES if keep is None else keep
+    batch = log_archive_batch + 1
+    moved = 0
+    with LOG_ARCHIVE_FILE.open("a", encoding="utf-8") as f:
+        for name, player in players.items():
+            log = player.transaction_log
+            cut = len(log) - keep
+            if cut <= 0:
                 continue
-            t = t.replace(second=0, microsecond=0)
-            buckets[t] = rec["money"]  # last value in that minute wins
-
-        # Start from the last known balance BEFORE the window; otherwise leave undefined
-        last_val = None
-        if buckets:
-            before = [t for t in buckets.keys() if t < start]
-            if before:
-                last_val = buckets[max(before)]
-
-        # Build minute-by-minute series; no prefill if no prior value
-        pts = []
-        t = start
-        while t <= now:
-            if t in buckets:
-                last_val = buckets[t]
-            # Append None (→ null in JSON) until we have the first known value
-            pts.append([iso_minute(t), last_val])
-            t += timedelta(minutes=1)
-
-        series[name] = pts
-
-
-    resp = jsonify(series)
+            if cut < len(log) and isinstance(log[cut], dict) and isinstance(log[cut - 1], str):
+                cut -= 1            # keep a text entry together with its record
+            for _, ts, money, entry in ledger_rows(name, log, cut):
+                f.write(json.dumps({"player": name, "ts": ts, "money": money, "entry": entry,
+                                    "batch": batch}, ensure_ascii=False))
+                f.write("\n")
+            # A new list: published snapshots keep reading the old one
+            player.transaction_log = log[cut:]
+            moved += cut
+        f.flush()
+        os.fsync(f.fileno())
+    if moved:
+        # Only once the save file knows this batch are its rows really moved;
+        # after a crash before that, drop_unsaved_archive_rows() removes them
+        log_archive_batch = batch
+        write_state_file()
+        # The archive and the published logs must agree (see open_archive)
+        publish_snapshot()
+    return moved
+
+
+def drop_unsaved_archive_rows() -> None:
+    """
+    Cut archive rows of batches the save file doesn't know about: the
+    process died before writing the trimmed logs, so they are still there.
+    """
+    if not LOG_ARCHIVE_FILE.exists():
+        return
+    offset = 0
+    with LOG_ARCHIVE_FILE.open("r+b") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {"batch": log_archive_batch + 1}      # torn write: cut it too
+            if not line.endswith(b"\n") or row.get("batch", 0) > log_archive_batch:
+                f.truncate(offset)
+                return
+            offset += len(line)
+
+
+drop_unsaved_archive_rows()
+
+
+def deleted_label(name: str) -> str:
+    """Name archived rows of a deleted player are kept under."""
+    return f"{name} (deleted {iso_now()})"
+
+
+def follow_rename(relabel: dict, old: str, new: str) -> None:
+    """
+    Record in *relabel* ({archived name: current name}) that *old* became
+    *new*.  A name that was renamed away earlier in the same batch and then
+    re-added belongs to a new player with nothing archived yet.
+    """
+    moved = [name for name, current in relabel.items() if current == old]
+    for name in moved:
+        relabel[name] = new
+    if not moved and old not in relabel:
+        relabel[old] = new
+
+
+def relabel_archived_rows(relabel: dict) -> None:
+    """
+    Re-label archived ledger rows after renames / deletes, so a player added
+    later under an old name never inherits someone else's archive.
+    """
+    relabel = {old: new for old, new in relabel.items() if old != new}
+    if not relabel or not LOG_ARCHIVE_FILE.exists():
+        return
+    tmp = LOG_ARCHIVE_FILE.with_name(LOG_ARCHIVE_FILE.name + ".tmp")
+    with LOG_ARCHIVE_FILE.open("r", encoding="utf-8") as src, tmp.open("w", encoding="utf-8") as dst:
+        for line in src:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue            # torn last line after a crash
+            if row.get("player") in relabel:
+                row["player"] = relabel[row["player"]]
+            dst.write(json.dumps(row, ensure_ascii=False))
+            dst.write("\n")
+    os.replace(tmp, LOG_ARCHIVE_FILE)   # running exports keep reading the old file
+
+
+def enforce_memory_budget(level=None) -> list:
+    """
+    Free memory according to the budget *level* ("soft" / "hard", default:
+    measured now).  Soft drops caches that rebuild on demand and compacts
+    the in-memory history; hard also archives old transaction log entries.
+    Must be called with ``state_lock`` held.  Returns the actions taken.
+    """
+    level = level or memory_budget.level()
+    if level is None:
+        return []
+    app.jinja_env.cache.clear()
+    _static_hashes.clear()
+    actions = ["template_cache_cleared", "static_fingerprints_cleared",
+               f"history_events_dropped:{history.compact(2)}"]
+    if level == "hard":
+        moved = archive_transaction_logs()
+        actions.append(f"log_entries_archived:{moved}")
+    actions.append(f"gc_collected:{gc.collect()}")
+    memory_budget.last_actions = [iso_now(), level] + actions
+    app.logger.warning("Memory budget %s: %s", level, ", ".join(actions))
+    return actions
+
+
+@app.route('/admin/memory')
+def memory_report():
+    """
+    Where the memory goes: process RSS against the budgets, optional
+    tracemalloc sites and an estimate per structure.  Shared objects are
+    counted once, in the first section that reaches them (so snapshots only
+    show what they don't share with the live state).  Trading carries on
+    while the report is built.
+    """
+    # Only the live P&L dicts and the catalog can grow while we walk them;
+    # copy those under a short lock and walk everything else lock-free
+    # (logs are append-only, snapshots and history records immutable).
+    with state_lock:
+        live = {name: (p, dict(p.pnl.items), dict(p.pnl.routes)) for name, p in players.items()}
+        catalog_bytes = deep_size(catalog)
+
+    # Framework objects reachable from templates aren't freed by clearing the cache
+    seen = {id(app), id(app.jinja_env), id(app.jinja_env.globals), id(app.config)}
+    per_player = {}
+    for name, (p, pnl_items, pnl_routes) in live.items():
+        seen.update((id(p.pnl.items), id(p.pnl.routes)))
+        log = p.transaction_log
+        log_bytes = deep_size(log, seen)
+        per_player[name] = {
+            "state_bytes": deep_size(p, seen) + deep_size(pnl_items, seen) + deep_size(pnl_routes, seen),
+            "log_bytes": log_bytes,
+            "log_entries": len(log),
+        }
+    snap = current_snapshot()
+    cache = app.jinja_env.cache
+    sections = {
+        "players": sum(v["state_bytes"] for v in per_player.values()),
+        "transaction_logs": sum(v["log_bytes"] for v in per_player.values()),
+        "city_prices": deep_size(snap.city_prices, seen),
+        "catalog": catalog_bytes,
+        "history": deep_size(history, seen),
+        "snapshots": deep_size(snap, seen),
+        "static_fingerprints": deep_size(dict(_static_hashes), seen),
+        "template_cache": deep_size(list(cache.values()), seen) if cache is not None else 0,
+    }
+    history_counts = {"events": len(history.events), "checkpoints": len(history.checkpoints)}
+
+    rss = process_rss()
+    resp = fast_jsonify({
+        "rss_bytes": rss,
+        "soft_limit_bytes": memory_budget.soft_bytes,
+        "hard_limit_bytes": memory_budget.hard_bytes,
+        "level": memory_budget.level(rss),
+        "last_enforcement": memory_budget.last_actions,
+        "sections": sections,
+        "players": per_player,
+        "history": history_counts,
+        "tracemalloc": tracemalloc_summary(),
+    })
     resp.headers["Cache-Control"] = "no-store"
-    resp.headers["Pragma"] = "no-cache"
     return resp
 
 
@@ -644,17 +1416,12 @@ def money_series():
 #  ADD a player
 # ------------------------------------------------------------------
 @app.route('/add_player', methods=['POST'])
+@writes_state
 def add_player():
     name = request.form.get('new_player_name', '').strip()
     if not name or name in players:
         return redirect(url_for('admin'))
-    players[name] = {
-        "money": 10000,
-        "capacity": 2,
-        "cargo": ["", ""],
-        "transaction_log": []
-    }
-    players[name]["transaction_log"].append({"ts": iso_now(), "money": players[name]["money"]})
+    players[name] = new_player()
 
     save_game_state()
     return redirect(url_for('admin'))
@@ -664,6 +1431,7 @@ def add_player():
 #  RENAME a player
 # ------------------------------------------------------------------
 @app.route('/rename_player', methods=['POST'])
+@writes_state
 def rename_player():
     old = request.form.get('old_name')
     new = request.form.get('new_name', '').strip()
@@ -676,6 +1444,7 @@ def rename_player():
     global selected_player
     if selected_player == old:
         selected_player = new
+    relabel_archived_rows({old: new})
     save_game_state()
     return redirect(url_for('admin'))
 
@@ -684,6 +1453,7 @@ def rename_player():
 #  DELETE a player
 # ------------------------------------------------------------------
 @app.route('/delete_player', methods=['POST'])
+@writes_state
 def delete_player():
     name = request.form.get('delete_player_name')
     if name in players:
@@ -692,6 +1462,7 @@ def delete_player():
         if selected_player == name:
             # pick the first remaining name or blank if none
             selected_player = next(iter(players), '')
+        relabel_archived_rows({name: deleted_label(name)})
         save_game_state()
     return redirect(url_for('admin'))
 
@@ -710,26 +1481,60 @@ def player_page(player_name):
     selected_player = player_name
     player_data = players[player_name]
     items = city_prices[selected_city]
+    snap = current_snapshot()     # roster and city status without the write lock
 
     return render_template(
         'index.html',
         items=items,
-        cargo=player_data['cargo'],
-        money=player_data['money'],
+        cargo=player_data.cargo_names(catalog),
+        money=player_data.money,
         cities=cities,
         selected_city=selected_city,
-        log=player_data['transaction_log'],
-        players=players.keys(),
+        log=player_data.transaction_log,
+        players=snap.players.keys(),
         selected_player=player_name,
         breaking_news=breaking_news,
-        closed_cities=closed_cities,
-        capacity=player_data['capacity'],
-        upgrade_cost=next_upgrade_cost(player_data['capacity']),
+        closed_cities=snap.closed_cities,
+        capacity=player_data.capacity,
+        upgrade_cost=next_upgrade_cost(player_data.capacity),
         is_upgrade_city=(selected_city == UPGRADE_CITY),
+        trade_socket=Sock is not None,
     )
 
 
 
+@app.route('/p/<player_name>/stats')
+def player_stats(player_name):
+    """Realized profit & loss per item and per route (buy city → sell city)."""
+    if player_name not in players:
+        return jsonify(error=f"Ukendt spiller: {player_name}"), 404
+    pnl = players[player_name].pnl
+
+    items = {}
+    for item_id, (bought, spent, sold, revenue, cost) in list(pnl.items.items()):
+        items[catalog.item_name(item_id)] = {
+            "bought": bought, "spent": spent,
+            "sold": sold, "revenue": revenue, "cost": cost, "profit": revenue - cost,
+        }
+    routes = [
+        {"from": catalog.city_name(src), "to": catalog.city_name(dst),
+         "sold": sold, "revenue": revenue, "cost": cost, "profit": revenue - cost}
+        for (src, dst), (sold, revenue, cost) in list(pnl.routes.items())
+    ]
+    routes.sort(key=lambda r: -r["profit"])
+
+    resp = jsonify(
+        player=player_name,
+        realized_profit=pnl.realized,
+        written_off=pnl.written_off,
+        unmatched_sales=pnl.unmatched_sales,
+        items=items,
+        routes=routes,
+    )
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+
 @app.route('/popularity')
 def popularity():
     """
@@ -746,48 +1551,66 @@ def popularity():
     now = datetime.now(timezone.utc)
     start = now - timedelta(hours=hours)
 
-    per_city = {}   # {city: {item: count}}
-    total    = {}   # {item: count}
+    sales = []
+    for view in current_snapshot().players.values():
+        sales.extend(scan_log(view.log, view.log_length, start)[1])
 
-    for pdata in players.values():
-        log = pdata.get("transaction_log", [])
-        i = 0
-        while i < len(log):
-            entry = log[i]
-            if isinstance(entry, str):
-                m = SELL_RE.match(entry.strip())
-                if m:
-                    ts = None
-                    if i + 1 < len(log) and isinstance(log[i+1], dict):
-                        ts_raw = log[i+1].get("ts")
-                        if ts_raw:
-                            try:
-                                ts = parse_iso(ts_raw)
-                            except Exception:
-                                ts = None
-                    if ts and ts >= start:
-                        city = m.group("city") or "Unknown"
-                        item = m.group("item") or "Unknown"
-                        per_city.setdefault(city, {}).setdefault(item, 0)
-                        per_city[city][item] += 1
-                        total.setdefault(item, 0)
-                        total[item] += 1
-                    i += 2
-                    continue
-            i += 1
+    resp = fast_jsonify(summarize_sales(sales, hours))
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["Pragma"] = "no-cache"
+    return resp
 
-    def top_list(d: dict, k: int):
-        return sorted(([k_, v] for k_, v in d.items()), key=lambda x: (-x[1], x[0]))[:k]
 
-    top_per_city = {c: top_list(items, 3) for c, items in per_city.items()}
-    top_global   = top_list(total, 10)
+@app.route('/admin/dashboard')
+def admin_dashboard():
+    """
+    Everything the admin page polls for, from one pass over one snapshot:
+    balance series, item popularity, roster stats and city status.
+    Query params: ?series_hours=1 (1..168)  &pop_hours=0.5 (fractions ok, ≤168)
+    """
+    try:
+        series_hours = int(request.args.get("series_hours", 1))
+    except ValueError:
+        series_hours = 1
+    series_hours = max(1, min(series_hours, 168))
+    try:
+        pop_hours = float(request.args.get("pop_hours", 6))
+    except ValueError:
+        pop_hours = 6.0
+    pop_hours = max(1 / 60, min(pop_hours, 168))
 
-    resp = jsonify({
-        "window_hours": hours,
-        "per_city": per_city,
-        "top_per_city": top_per_city,
-        "top_global": top_global,
-        "cities": list(per_city.keys()),
+    now = datetime.now(timezone.utc)
+    minute = now.replace(second=0, microsecond=0)
+    series_start = minute - timedelta(hours=series_hours)
+    pop_start = now - timedelta(hours=pop_hours)
+
+    # One snapshot: the same log lengths, balances and prices feed every section
+    snap = current_snapshot()
+
+    series, sales, roster = {}, [], []
+    for name, view in snap.players.items():
+        buckets, player_sales, text_entries = scan_log(view.log, view.log_length, pop_start)
+        series[name] = fill_series(buckets, series_start, minute)
+        sales.extend(player_sales)
+        roster.append({
+            "player": name,
+            "money": view.money,
+            "capacity": view.capacity,
+            "cargo_used": view.cargo_used,
+            "log_entries": text_entries,
+            "last_active": iso_minute(max(buckets)) if buckets else None,
+        })
+
+    resp = fast_jsonify({
+        "generated_at": now.replace(microsecond=0).isoformat(),
+        "series_hours": series_hours,
+        "money_series": series,
+        "popularity": summarize_sales(sales, pop_hours),
+        "roster": roster,
+        "cities": [
+            {"city": city, "closed": city in snap.closed_cities, "items": len(goods)}
+            for city, goods in snap.city_prices.items()
+        ],
     })
     resp.headers["Cache-Control"] = "no-store"
     resp.headers["Pragma"] = "no-cache"
@@ -0,0 +1,309 @@
+"""
+Monte Carlo balancing tool for the truck upgrade costs and price tables.
+
+Simulates many games of scripted traders on top of ``engine`` and reports
+how the economy behaves for every combination of the swept parameters:
+
+    python balance.py --games 2000 --start-cost 3000 5000 --upgrade-step 5000 7500
+    python balance.py --prices prices.json --price-scale 0.8 1.0 1.2 --json out.json
+
+Games are spread over all cores with a ``ProcessPoolExecutor``.  Each game
+is seeded, so a run is reproducible for the same arguments.
+"""
+import argparse
+import itertools
+import json
+import random
+import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+from engine import DEFAULT_CITY_PRICES_EU, DEFAULT_VOGN_SETTINGS, UPGRADE_CITY, GameState, TradeError
+from models import EMPTY, Player
+
+START_MONEY = 10000
+
+
+# ---------------------------------------------------------------------
+#  Scripted traders
+# ---------------------------------------------------------------------
+class Bot:
+    """Where a simulated trader is and what it has seen so far."""
+
+    __slots__ = ("name", "strategy", "city", "first_upgrade", "sold")
+
+    def __init__(self, name: str, strategy: str, city: str):
+        self.name = name
+        self.strategy = strategy
+        self.city = city
+        self.first_upgrade = None   # turn of the first truck upgrade
+        self.sold = Counter()       # item → units sold
+
+
+class Market:
+    """Lookup tables the greedy trader plans with (computed once per game)."""
+
+    def __init__(self, city_prices: dict):
+        self.trade_cities = [c for c, goods in city_prices.items() if goods]
+        self.best_sale = {}             # item → (city, price)
+        for city, goods in city_prices.items():
+            for item, price in goods.items():
+                if price > self.best_sale.get(item, ("", 0))[1]:
+                    self.best_sale[item] = (city, price)
+        self.mean_price = {
+            item: statistics.mean(goods[item] for goods in city_prices.values() if item in goods)
+            for item in self.best_sale
+        }
+
+
+def _sell_here(game, market, bot, only_best: bool) -> None:
+    player = game.players[bot.name]
+    goods = game.city_prices[bot.city]
+    for slot, item_id in enumerate(player.cargo):
+        if item_id == EMPTY:
+            continue
+        item = game.catalog.item_name(item_id)
+        if item in goods and (not only_best or goods[item] >= market.best_sale[item][1]):
+            engine.sell(game, bot.name, bot.city, slot)
+            bot.sold[item] += 1
+
+
+def _try_upgrade(game, bot, turn: int, reserve: float) -> None:
+    player = game.players[bot.name]
+    while True:
+        cost = engine.upgrade_cost(game.vogn_settings, player.capacity)
+        if player.money < cost * reserve:
+            break
+        engine.upgrade(game, bot.name, bot.city)
+        if bot.first_upgrade is None:
+            bot.first_upgrade = turn
+        if cost <= 0:
+            break               # free upgrades: one per visit, or we'd never leave
+
+
+def greedy_turn(game, market, bot, turn, rng) -> None:
+    """Buy the widest spread available, drive to its best buyer, repeat."""
+    player = game.players[bot.name]
+    if bot.city == UPGRADE_CITY:
+        _try_upgrade(game, bot, turn, reserve=2.0)
+    else:
+        _sell_here(game, market, bot, only_best=True)
+        goods = game.city_prices[bot.city]
+        spreads = sorted(
+            ((market.best_sale[item][1] - price, item) for item, price in goods.items()),
+            reverse=True,
+        )
+        for spread, item in spreads:
+            if spread <= 0:
+                break
+            while player.first_free_slot() >= 0 and player.money >= goods[item]:
+                engine.buy(game, bot.name, bot.city, item)
+
+    loaded = [i for i in player.cargo if i != EMPTY]
+    if loaded:
+        bot.city = market.best_sale[game.catalog.item_name(loaded[0])][0]
+    elif player.money >= engine.upgrade_cost(game.vogn_settings, player.capacity) * 2.0:
+        bot.city = UPGRADE_CITY
+    else:
+        bot.city = rng.choice(market.trade_cities)
+
+
+def random_turn(game, market, bot, turn, rng) -> None:
+    """Sell anything sellable, buy something affordable, wander off."""
+    player = game.players[bot.name]
+    if bot.city == UPGRADE_CITY:
+        if rng.random() < 0.5:
+            _try_upgrade(game, bot, turn, reserve=1.0)
+    else:
+        _sell_here(game, market, bot, only_best=False)
+        goods = game.city_prices[bot.city]
+        affordable = [item for item, price in goods.items() if price <= player.money]
+        while affordable and player.first_free_slot() >= 0:
+            engine.buy(game, bot.name, bot.city, rng.choice(affordable))
+            affordable = [item for item in affordable if goods[item] <= player.money]
+    bot.city = rng.choice(market.trade_cities + [UPGRADE_CITY])
+
+
+STRATEGIES = {
+    "greedy": greedy_turn,
+    "random": random_turn,
+}
+
+
+# ---------------------------------------------------------------------
+#  Simulation
+# ---------------------------------------------------------------------
+def simulate_game(params: dict, seed: int) -> list:
+    """Play one game and return one result dict per bot."""
+    rng = random.Random(seed)
+    scale = params["price_scale"]
+    city_prices = {
+        city: {item: max(1, round(price * scale)) for item, price in goods.items()}
+        for city, goods in params["city_prices"].items()
+    }
+    bots = [
+        Bot(f"{strategy}-{i}", strategy, rng.choice(list(city_prices)))
+        for strategy in params["strategies"]
+        for i in range(params["players_per_strategy"])
+    ]
+    game = GameState(
+        {bot.name: Player(START_MONEY, 2) for bot in bots},
+        city_prices,
+        vogn_settings={"start_cost": params["start_cost"], "upgrade_step": params["upgrade_step"]},
+        log_trades=False,
+    )
+    market = Market(city_prices)
+
+    for turn in range(1, params["turns"] + 1):
+        for bot in bots:
+            try:
+                STRATEGIES[bot.strategy](game, market, bot, turn, rng)
+            except TradeError:
+                bot.city = rng.choice(list(city_prices))
+
+    results = []
+    for bot in bots:
+        player = game.players[bot.name]
+        cargo_value = sum(market.mean_price[game.catalog.item_name(i)]
+                          for i in player.cargo if i != EMPTY)
+        results.append({
+            "strategy": bot.strategy,
+            "wealth": round(player.money + cargo_value),
+            "capacity": player.capacity,
+            "first_upgrade": bot.first_upgrade,
+            "sold": dict(bot.sold),
+        })
+    return results
+
+
+def simulate_batch(params: dict, seeds: list) -> list:
+    """Worker entry point: several games for one parameter combination."""
+    results = []
+    for seed in seeds:
+        results.extend(simulate_game(params, seed))
+    return results
+
+
+# ---------------------------------------------------------------------
+#  Reporting
+# ---------------------------------------------------------------------
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(params: dict, results: list) -> dict:
+    by_strategy = {}
+    for strategy in params["strategies"]:
+        rows = [r for r in results if r["strategy"] == strategy]
+        wealth = [r["wealth"] for r in rows]
+        upgrades = [r["first_upgrade"] for r in rows if r["first_upgrade"] is not None]
+        by_strategy[strategy] = {
+            "players": len(rows),
+            "wealth_mean": round(statistics.mean(wealth)) if wealth else None,
+            "wealth_p10": percentile(wealth, 0.10),
+            "wealth_p50": percentile(wealth, 0.50),
+            "wealth_p90": percentile(wealth, 0.90),
+            "upgraded_share": round(len(upgrades) / len(rows), 3) if rows else None,
+            "first_upgrade_p50": percentile(upgrades, 0.50),
+            "mean_capacity": round(statistics.mean(r["capacity"] for r in rows), 2) if rows else None,
+        }
+    popularity = Counter()
+    for r in results:
+        popularity.update(r["sold"])
+    total_sold = sum(popularity.values()) or 1
+    return {
+        "start_cost": params["start_cost"],
+        "upgrade_step": params["upgrade_step"],
+        "price_scale": params["price_scale"],
+        "strategies": by_strategy,
+        "item_popularity": {item: round(n / total_sold, 3) for item, n in popularity.most_common()},
+    }
+
+
+def print_report(summaries: list) -> None:
+    for s in summaries:
+        print(f"\nstart_cost={s['start_cost']}  upgrade_step={s['upgrade_step']}  "
+              f"price_scale={s['price_scale']}")
+        print(f"  {'strategy':<8} {'p10':>9} {'p50':>9} {'p90':>9} {'upgraded':>9} "
+              f"{'1st upg':>8} {'cap':>5}")
+        for name, st in s["strategies"].items():
+            print(f"  {name:<8} {st['wealth_p10']!s:>9} {st['wealth_p50']!s:>9} "
+                  f"{st['wealth_p90']!s:>9} {st['upgraded_share']!s:>9} "
+                  f"{st['first_upgrade_p50']!s:>8} {st['mean_capacity']!s:>5}")
+        top = ", ".join(f"{item} {share:.0%}" for item, share in
+                        list(s["item_popularity"].items())[:5])
+        print(f"  most sold: {top}")
+
+
+def run(args) -> list:
+    city_prices = DEFAULT_CITY_PRICES_EU
+    if args.prices:
+        with open(args.prices, encoding="utf-8") as f:
+            city_prices = json.load(f)
+        city_prices.setdefault(UPGRADE_CITY, {})
+
+    combos = [
+        {
+            "start_cost": start_cost,
+            "upgrade_step": upgrade_step,
+            "price_scale": price_scale,
+            "city_prices": city_prices,
+            "strategies": args.strategies,
+            "players_per_strategy": args.players_per_strategy,
+            "turns": args.turns,
+        }
+        for start_cost, upgrade_step, price_scale in itertools.product(
+            args.start_cost, args.upgrade_step, args.price_scale)
+    ]
+
+    seeds = list(range(args.seed, args.seed + args.games))
+    chunks = [seeds[i:i + args.chunk] for i in range(0, len(seeds), args.chunk)]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [[pool.submit(simulate_batch, params, chunk) for chunk in chunks]
+                   for params in combos]
+        return [
+            summarize(params, [r for f in combo_futures for r in f.result()])
+            for params, combo_futures in zip(combos, futures)
+        ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=1000, help="games per parameter combination")
+    parser.add_argument("--turns", type=int, default=120, help="city visits per player per game")
+    parser.add_argument("--start-cost", type=int, nargs="+",
+                        default=[DEFAULT_VOGN_SETTINGS["start_cost"]])
+    parser.add_argument("--upgrade-step", type=int, nargs="+",
+                        default=[DEFAULT_VOGN_SETTINGS["upgrade_step"]])
+    parser.add_argument("--price-scale", type=float, nargs="+", default=[1.0],
+                        help="multiply every price by these factors")
+    parser.add_argument("--prices", help="JSON price table {city: {item: price}} to test instead of the defaults")
+    parser.add_argument("--strategies", nargs="+", choices=sorted(STRATEGIES), default=sorted(STRATEGIES))
+    parser.add_argument("--players-per-strategy", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=50, help="games per worker task")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the summaries to this file")
+    args = parser.parse_args(argv)
+    if min(args.start_cost + args.upgrade_step) < 0:
+        parser.error("--start-cost and --upgrade-step must not be negative")
+    if 0 in args.start_cost and 0 in args.upgrade_step:
+        parser.error("--start-cost 0 together with --upgrade-step 0 makes every upgrade free")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    summaries = run(args)
+    print_report(summaries)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Micro-benchmarks for the hot paths of the game server.
+
+Builds synthetic games of growing size and times the functions whose cost
+grows with the history – saving, loading (incl. ``migrate_theme_data``),
+the chart endpoints, log remapping and rendering the two main pages:
+
+    python bench.py --players 8 --trades 1000 10000 100000 --json bench.json
+
+Each result row holds the game size and min / median milliseconds, so two
+JSON files from different commits can be compared directly.  Everything
+runs against a temporary directory; the real save files are never touched.
+"""
+import argparse
+import copy
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import engine
+from engine import DEFAULT_CITY_PRICES_EU, DEFAULT_VOGN_SETTINGS, GameState, TradeError
+from models import EMPTY, Catalog, Player
+
+
+# ---------------------------------------------------------------------
+#  Synthetic games
+# ---------------------------------------------------------------------
+def synthetic_game(players: int, trades: int, spread_hours: float = 6.0, seed: int = 0) -> dict:
+    """
+    A save file (the dict ``load_game_state`` reads) after *trades* random
+    buys and sells by *players* players, evenly spread over the last
+    *spread_hours* hours.
+    """
+    rng = random.Random(seed)
+    city_prices = copy.deepcopy(DEFAULT_CITY_PRICES_EU)
+    catalog = Catalog()
+    catalog.add_prices(city_prices)
+    trade_cities = [city for city, goods in city_prices.items() if goods]
+    names = [f"Player {i}" for i in range(1, players + 1)]
+
+    start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=spread_hours)
+    step = timedelta(hours=spread_hours) / max(1, trades)
+    done = 0
+
+    def clock():
+        return (start + step * done).isoformat()
+
+    game = GameState(
+        {name: Player(10_000_000, rng.randint(2, 8)) for name in names},
+        city_prices, vogn_settings=dict(DEFAULT_VOGN_SETTINGS), catalog=catalog, clock=clock,
+    )
+    while done < trades:
+        name = rng.choice(names)
+        player = game.players[name]
+        city = rng.choice(trade_cities)
+        loaded = [slot for slot, item_id in enumerate(player.cargo) if item_id != EMPTY]
+        try:
+            if loaded and (player.first_free_slot() < 0 or rng.random() < 0.5):
+                engine.sell(game, name, city, rng.choice(loaded))
+            else:
+                engine.buy(game, name, city, rng.choice(list(city_prices[city])))
+        except TradeError:
+            continue                # this city doesn't trade it – try another move
+        done += 1
+
+    return {
+        "players": {name: p.to_dict(catalog) for name, p in game.players.items()},
+        "selected_city": trade_cities[0],
+        "selected_player": names[0],
+        "city_prices": city_prices,
+        "breaking_news": "",
+        "closed_cities": [],
+        "vogn_settings": dict(DEFAULT_VOGN_SETTINGS),
+    }
+
+
+def install(app_module, data: dict, directory: Path) -> None:
+    """Make *data* the live state of *app_module*, saving into *directory*."""
+    from history import GameHistory
+
+    app_module.BACKUP_FILE = directory / "game_state.json"
+    app_module.LOG_ARCHIVE_FILE = directory / "game_log_archive.ndjson"
+    history_file = directory / "game_history.ndjson"
+    if history_file.exists():
+        history_file.unlink()
+    app_module.history = GameHistory(history_file)
+
+    data = copy.deepcopy(data)
+    app_module.catalog.add_prices(data["city_prices"])
+    app_module.players = app_module.build_players(data["players"])
+    app_module.selected_city = data["selected_city"]
+    app_module.selected_player = data["selected_player"]
+    app_module.city_prices = data["city_prices"]
+    app_module.breaking_news = data["breaking_news"]
+    app_module.closed_cities = data["closed_cities"]
+    app_module.vogn_settings = data["vogn_settings"]
+    app_module.cities = list(data["city_prices"])
+    app_module.save_game_state()
+
+
+# ---------------------------------------------------------------------
+#  Timing
+# ---------------------------------------------------------------------
+def measure(fn, repeat: int, setup=None) -> dict:
+    """Run *fn* *repeat* times (after *setup*, untimed) and return timings in ms."""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg) if setup else fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"min_ms": round(min(times), 3), "median_ms": round(statistics.median(times), 3)}
+
+
+def view(app_module, endpoint: str, path: str):
+    """Call a view function directly inside a request context (no WSGI, no after_request)."""
+    func = app_module.app.view_functions[endpoint]
+
+    def call():
+        with app_module.app.test_request_context(path):
+            func()
+    return call
+
+
+def bench_game(app_module, data: dict, repeat: int) -> dict:
+    """Time every benchmark against one installed game."""
+    log_entries = [e for p in data["players"].values() for e in p["transaction_log"]]
+    benches = {
+        "save_game_state": measure(app_module.save_game_state, repeat),
+        "load_game_state": measure(app_module.load_game_state, repeat),
+        "migrate_theme_data": measure(app_module.migrate_theme_data, repeat,
+                                      setup=lambda: copy.deepcopy(data)),
+        "remap_log_entry": measure(lambda: [app_module.remap_log_entry(e) for e in log_entries], repeat),
+        "money_series": measure(view(app_module, "money_series", "/money_series?hours=24"), repeat),
+        "popularity": measure(view(app_module, "popularity", "/popularity?hours=24"), repeat),
+        "render_index": measure(view(app_module, "index", "/"), repeat),
+        "render_admin": measure(view(app_module, "admin", "/admin"), repeat),
+    }
+    return benches
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=Path(__file__).parent, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run(args) -> dict:
+    import app as app_module
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for trades in args.trades:
+            data = synthetic_game(args.players, trades, args.spread_hours, args.seed)
+            install(app_module, data, Path(tmp))
+            log_entries = sum(len(p["transaction_log"]) for p in data["players"].values())
+            for name, timing in bench_game(app_module, data, args.repeat).items():
+                results.append({"bench": name, "players": args.players, "trades": trades,
+                                "log_entries": log_entries, **timing})
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "generated_at": engine.iso_now(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"commit {report['commit']}  python {report['python']}  repeat {report['repeat']}")
+    print(f"  {'bench':<20} {'trades':>8} {'min ms':>10} {'median ms':>10}")
+    for row in report["results"]:
+        print(f"  {row['bench']:<20} {row['trades']:>8} {row['min_ms']:>10} {row['median_ms']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--trades", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="total trades per synthetic game (one game per value)")
+    parser.add_argument("--spread-hours", type=float, default=6.0,
+                        help="trades are spread evenly over this many hours up to now")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file ('-' for stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.json == "-":
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Headless game rules.
+
+Everything a trade can do – buy, sell, clear a slot, upgrade the truck,
+admin balance adjustments – as plain function calls on a ``GameState``.
+No Flask, no disk: the routes in ``app.py`` wrap these and persist
+afterwards, and bots / balancing tools can call them directly.
+
+Refused actions raise ``TradeError`` with the message shown to the player.
+"""
+from datetime import datetime, timezone
+
+from models import EMPTY, Catalog, Player
+
+CURRENCY_SYMBOL = "¥"
+UPGRADE_CITY = "Yamato værksted"
+
+# Price table of a fresh game: {city: {item: price}}
+DEFAULT_CITY_PRICES_EU = {
+    "Tokyo": {
+        "Nudler": 900,
+        "Wasabi": 1400,
+        "Matcha": 2100,
+        "Kimonoer": 2400,
+        "Ramenkits": 3000,
+        "Sake": 4000,
+    },
+    "Osaka": {
+        "Nudler": 1100,
+        "Wasabi": 1600,
+        "Matcha": 2300,
+        "Kimonoer": 2700,
+        "Ramenkits": 3400,
+        "Sake": 4600,
+        "Tun": 5900,
+    },
+    "Kyoto": {
+        "Matcha": 2400,
+        "Kimonoer": 2600,
+        "Katanasværd": 7400,
+        "Bonsaitræer": 8800,
+        "Shinto-amuletter": 10800,
+        "Samurai-rustninger": 14700,
+    },
+    "Yokohama": {
+        "Nudler": 800,
+        "Ramenkits": 3300,
+        "Sake": 4400,
+        "Tun": 5700,
+        "Katanasværd": 7000,
+        "Bonsaitræer": 8500,
+    },
+    "Sapporo": {
+        "Wasabi": 1700,
+        "Matcha": 2000,
+        "Kimonoer": 2300,
+        "Sake": 3800,
+        "Tun": 5200,
+        "Katanasværd": 6500,
+    },
+    "Kobe": {
+        "Ramenkits": 3600,
+        "Sake": 4700,
+        "Tun": 6100,
+        "Bonsaitræer": 9000,
+        "Shinto-amuletter": 11000,
+        "Samurai-rustninger": 15000,
+    },
+    "Nagasaki": {
+        "Nudler": 1000,
+        "Wasabi": 1500,
+        "Matcha": 2200,
+        "Kimonoer": 2500,
+        "Ramenkits": 3100,
+        "Sake": 4100,
+        "Shinto-amuletter": 9300,
+    },
+    UPGRADE_CITY: {},
+}
+
+DEFAULT_VOGN_SETTINGS = {
+    "start_cost": 5000,
+    "upgrade_step": 7500}
+
+
+def iso_now():
+    """UTC ISO-8601 timestamp, seconds only."""
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+class TradeError(Exception):
+    """An action the rules refuse. ``str(err)`` is the player-facing message."""
+
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class GameState:
+    """
+    The mutable game data the rules operate on.
+
+    The containers are used as-is (not copied), so the app can hand in its
+    live state.  ``clock`` stamps log records; ``log_trades=False`` skips
+    the transaction log entirely for fast simulations.
+    """
+
+    __slots__ = ("players", "city_prices", "closed_cities", "vogn_settings",
+                 "catalog", "clock", "log_trades")
+
+    def __init__(self, players: dict, city_prices: dict, closed_cities=(),
+                 vogn_settings: dict = None, catalog: Catalog = None,
+                 clock=iso_now, log_trades: bool = True):
+        self.players = players
+        self.city_prices = city_prices
+        self.closed_cities = closed_cities
+        self.vogn_settings = vogn_settings if vogn_settings is not None else dict(DEFAULT_VOGN_SETTINGS)
+        if catalog is None:
+            catalog = Catalog()
+            catalog.add_prices(city_prices)
+        self.catalog = catalog
+        self.clock = clock
+        self.log_trades = log_trades
+
+    def _log(self, player: Player, text: str) -> None:
+        if self.log_trades:
+            player.transaction_log.append(text)
+            player.transaction_log.append({"ts": self.clock(), "money": player.money})
+
+
+def upgrade_cost(settings: dict, capacity: int) -> int:
+    """Return cost for upgrading capacity by one slot (not cumulative)."""
+    start_cost = int(settings.get("start_cost", DEFAULT_VOGN_SETTINGS["start_cost"]))
+    upgrade_step = int(settings.get("upgrade_step", DEFAULT_VOGN_SETTINGS["upgrade_step"]))
+    if capacity < 2:
+        return start_cost
+    return start_cost + upgrade_step * (capacity - 2)
+
+
+def buy(game: GameState, player_name: str, city: str, item: str) -> int:
+    """Put one *item* bought in *city* into the lowest free slot. Returns the price."""
+    player = game.players[player_name]
+    if city in game.closed_cities:
+        raise TradeError(f"{city} er lukket lige nu.")
+    slot = player.first_free_slot()
+    if slot < 0:
+        raise TradeError("Alle lastrum er fyldt. Overvej en opgradering.")
+    items = game.city_prices[city]
+    if item not in items:
+        raise TradeError("Varen blev ikke fundet.")
+    price = items[item]
+    if player.money < price:
+        raise TradeError("Du har ikke yen nok.")
+
+    item_id = game.catalog.item_id(item)
+    player.put(slot, item_id, price, game.catalog.city_id(city))
+    player.pnl.record_buy(item_id, price)
+    player.money -= price
+    game._log(player, f"Købte {item} for {CURRENCY_SYMBOL}{price} i {city}.")
+    return price
+
+
+def sell(game: GameState, player_name: str, city: str, slot: int):
+    """Sell the cargo in *slot* (0-based) to *city*. Returns ``(item, price)``."""
+    player = game.players[player_name]
+    if city in game.closed_cities:
+        raise TradeError(f"{city} er lukket lige nu.")
+    if not 0 <= slot < len(player.cargo) or player.cargo[slot] == EMPTY:
+        raise TradeError("Ugyldig lasteplads.")
+    item = game.catalog.item_name(player.cargo[slot])
+    items = game.city_prices[city]
+    if item not in items:
+        raise TradeError(f"{city} efterspørger ikke {item}.", status=400)
+    price = items[item]
+
+    basis, origin = player.basis[slot], player.origin[slot]
+    item_id = player.take(slot)
+    player.pnl.record_sale(item_id, price, game.catalog.city_id(city), basis, origin)
+    player.money += price
+    game._log(player, f"Solgte {item} for {CURRENCY_SYMBOL}{price} i {city}.")
+    return item, price
+
+
+def clear(game: GameState, player_name: str, slot: int) -> None:
+    """Throw away whatever is in *slot* (0-based)."""
+    player = game.players[player_name]
+    if not 0 <= slot < len(player.cargo):
+        raise TradeError("Ugyldig lasteplads.")
+    basis = player.basis[slot]
+    if player.take(slot) != EMPTY:
+        player.pnl.record_write_off(basis)
+
+
+def upgrade(game: GameState, player_name: str, city: str) -> int:
+    """Buy one extra cargo slot at the workshop. Returns the cost."""
+    if city != UPGRADE_CITY:
+        raise TradeError(f"Opgraderinger kan kun købes i {UPGRADE_CITY}.")
+    player = game.players[player_name]
+    cost = upgrade_cost(game.vogn_settings, player.capacity)
+    if player.money < cost:
+        raise TradeError("Du har ikke yen nok til opgraderingen.")
+
+    player.money -= cost
+    player.add_slot()
+    game._log(player, f"Opgraderede lastvognen til {player.capacity} pladser for {CURRENCY_SYMBOL}{cost}.")
+    return cost
+
+
+def adjust(game: GameState, player_name: str, delta: int) -> int:
+    """Admin balance change. Returns the new balance."""
+    player = game.players[player_name]
+    player.money += delta
+    game._log(player, f"Adminjustering: {CURRENCY_SYMBOL}{delta:+d}")
+    return player.money
@@ -0,0 +1,251 @@
+"""
+Event-sourced game history with periodic checkpoints.
+
+Every save diffs the game state against the last recorded one and appends
+the changes as small events to an NDJSON file.  Every
+``checkpoint_interval`` events a full copy of the state is written as a
+checkpoint, so rebuilding the state at any timestamp means loading the
+nearest earlier checkpoint and replaying at most one interval of events.
+``compact`` may drop old checkpoints from memory; an index of their file
+offsets stays behind, so they are read back from disk when queried.
+
+The recorded state is deliberately small: per-player money, capacity and
+cargo, the price table and the closed cities.  Transaction logs are not
+part of it – they already live in ``game_state.json``.
+"""
+import bisect
+import copy
+import json
+import threading
+from pathlib import Path
+
+CHECKPOINT_INTERVAL = 200
+
+
+def empty_state() -> dict:
+    return {"players": {}, "city_prices": {}, "closed_cities": []}
+
+
+def apply_event(state: dict, event: dict) -> None:
+    """Apply one recorded event to *state* in place."""
+    kind = event["type"]
+    if kind == "player":
+        state["players"][event["player"]] = {
+            "money": event["money"],
+            "capacity": event["capacity"],
+            "cargo": list(event["cargo"]),
+        }
+    elif kind == "player_removed":
+        state["players"].pop(event["player"], None)
+    elif kind == "prices":
+        state["city_prices"][event["city"]] = dict(event["goods"])
+    elif kind == "city_removed":
+        state["city_prices"].pop(event["city"], None)
+    elif kind == "closed_cities":
+        state["closed_cities"] = list(event["cities"])
+
+
+def diff_states(old: dict, new: dict) -> list:
+    """Events that turn *old* into *new* (without seq/ts)."""
+    events = []
+    old_players, new_players = old["players"], new["players"]
+    for name, pdata in new_players.items():
+        if old_players.get(name) != pdata:
+            events.append({"type": "player", "player": name, **pdata})
+    for name in old_players:
+        if name not in new_players:
+            events.append({"type": "player_removed", "player": name})
+
+    old_prices, new_prices = old["city_prices"], new["city_prices"]
+    for city, goods in new_prices.items():
+        if old_prices.get(city) != goods:
+            events.append({"type": "prices", "city": city, "goods": goods})
+    for city in old_prices:
+        if city not in new_prices:
+            events.append({"type": "city_removed", "city": city})
+
+    if old["closed_cities"] != new["closed_cities"]:
+        events.append({"type": "closed_cities", "cities": new["closed_cities"]})
+    return events
+
+
+class GameHistory:
+    """Append-only event log plus checkpoints, mirrored to an NDJSON file."""
+
+    def __init__(self, path, checkpoint_interval: int = CHECKPOINT_INTERVAL):
+        self.path = Path(path)
+        self.checkpoint_interval = checkpoint_interval
+        self.events = []            # recorded events, oldest first
+        self.first_seq = 0          # seq of self.events[0]
+        self.checkpoints = []       # in-memory [{"seq", "ts", "state"}], oldest first
+        # Index of *every* checkpoint, including ones compacted away
+        self._checkpoint_ts = []    # ts strings for bisect
+        self._checkpoint_seq = []
+        self._checkpoint_offset = []  # byte offset of the record in the file
+        self._current = None        # state as of the last recorded event
+        # capture/compact swap several lists at once; state_at must not see
+        # them half-way (it is served without the app's write lock)
+        self._lock = threading.Lock()
+        self._load()
+
+    # -- recording ----------------------------------------------------
+    @property
+    def next_seq(self) -> int:
+        return self.first_seq + len(self.events)
+
+    def capture(self, state: dict, ts: str) -> int:
+        """
+        Record whatever changed since the previous capture.
+        *state* must be a fresh dict in the shape of ``empty_state()``;
+        it is kept, so the caller must not mutate it afterwards.
+        Returns the number of events written.
+        """
+        with self._lock:
+            if self._current is None:
+                self._current = state
+                self._write([self._add_checkpoint(ts)])
+                return 0
+
+            records = []
+            for event in diff_states(self._current, state):
+                event = {"seq": self.next_seq, "ts": ts, **event}
+                self.events.append(event)
+                records.append(event)
+            self._current = state
+
+            if records and self.next_seq - self.checkpoints[-1]["seq"] >= self.checkpoint_interval:
+                records.append(self._add_checkpoint(ts))
+            if records:
+                self._write(records)
+            return len(records)
+
+    def _add_checkpoint(self, ts: str) -> dict:
+        checkpoint = {"seq": self.next_seq, "ts": ts,
+                      "state": copy.deepcopy(self._current)}
+        self.checkpoints.append(checkpoint)
+        self._checkpoint_ts.append(ts)
+        self._checkpoint_seq.append(checkpoint["seq"])
+        return {"type": "checkpoint", **checkpoint}
+
+    def _write(self, records) -> None:
+        with self.path.open("ab") as f:
+            offset = f.tell()
+            for record in records:
+                line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                if record.get("type") == "checkpoint":
+                    self._checkpoint_offset.append(offset)
+                f.write(line + b"\n")
+                offset += len(line) + 1
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        offset = 0
+        parsed = True
+        with self.path.open("rb") as f:
+            for line in f:
+                start, offset = offset, offset + len(line)
+                try:
+                    record = json.loads(line)
+                    parsed = True
+                except ValueError:
+                    parsed = False
+                    continue        # torn last line after a crash
+                if record.get("type") == "checkpoint":
+                    record.pop("type")
+                    if not self.checkpoints and not self.events:
+                        self.first_seq = record["seq"]
+                    self.checkpoints.append(record)
+                    self._checkpoint_ts.append(record["ts"])
+                    self._checkpoint_seq.append(record["seq"])
+                    self._checkpoint_offset.append(start)
+                elif self.checkpoints:
+                    self.events.append(record)
+            if offset and not line.endswith(b"\n"):
+                self._repair_tail(start, parsed)
+        if self.checkpoints:
+            last = self.checkpoints[-1]
+            self._current = copy.deepcopy(last["state"])
+            for event in self.events[last["seq"] - self.first_seq:]:
+                apply_event(self._current, event)
+
+    def _repair_tail(self, start: int, parsed: bool) -> None:
+        """
+        The last write was cut off.  Finish a record that only lacks its
+        newline, otherwise cut the fragment off – the next append would be
+        glued onto it and lost too.
+        """
+        with self.path.open("r+b") as f:
+            if parsed:
+                f.seek(0, 2)
+                f.write(b"\n")
+            else:
+                f.truncate(start)
+
+    def compact(self, keep_checkpoints: int = 2) -> int:
+        """
+        Forget, in memory only, everything before the newest
+        *keep_checkpoints* checkpoints.  Older timestamps stay queryable:
+        ``state_at`` reads them back from the file.  Returns the number of
+        events dropped.
+        """
+        keep_checkpoints = max(1, keep_checkpoints)
+        with self._lock:
+            if len(self.checkpoints) <= keep_checkpoints:
+                return 0
+            first = self.checkpoints[-keep_checkpoints]
+            dropped = first["seq"] - self.first_seq
+            self.events = self.events[dropped:]
+            self.first_seq = first["seq"]
+            self.checkpoints = self.checkpoints[-keep_checkpoints:]
+            return dropped
+
+    # -- querying -----------------------------------------------------
+    def state_at(self, ts: str):
+        """
+        Rebuild the state as it was at *ts* (UTC ISO-8601, seconds).
+        Returns ``(state, checkpoint_ts, replayed)`` or ``None`` when *ts*
+        lies before the first checkpoint.
+        """
+        # Under the lock only pick out one interval; replay it afterwards
+        with self._lock:
+            index = bisect.bisect_right(self._checkpoint_ts, ts) - 1
+            if index < 0:
+                return None
+            end = (self._checkpoint_seq[index + 1]
+                   if index + 1 < len(self._checkpoint_seq) else self.next_seq)
+            loaded = index - (len(self._checkpoint_ts) - len(self.checkpoints))
+            if loaded < 0:
+                offset = self._checkpoint_offset[index]
+            else:
+                checkpoint = self.checkpoints[loaded]
+                state = copy.deepcopy(checkpoint["state"])
+                events = self.events[checkpoint["seq"] - self.first_seq:end - self.first_seq]
+        if loaded < 0:
+            return self._state_at_from_file(offset, end, ts)
+
+        replayed = 0
+        for event in events:
+            if event["ts"] > ts:
+                break
+            apply_event(state, event)
+            replayed += 1
+        return state, checkpoint["ts"], replayed
+
+    def _state_at_from_file(self, offset: int, end: int, ts: str):
+        """``state_at`` for a compacted checkpoint: replay it from the file."""
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            checkpoint = json.loads(f.readline())
+            state = checkpoint["state"]
+            replayed = 0
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue        # torn line after a crash, as in _load
+                if event["seq"] >= end or event["ts"] > ts:
+                    break
+                apply_event(state, event)
+                replayed += 1
+        return state, checkpoint["ts"], replayed
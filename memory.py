@@ -0,0 +1,160 @@
+"""
+Memory accounting and soft / hard budgets for the game server.
+
+``deep_size`` estimates what a structure holds on to, ``process_rss``
+reads the resident size the container limit is enforced against, and
+``MemoryBudget`` decides when the app should start shedding memory.
+Set ``MEMORY_TRACE=1`` to also run ``tracemalloc`` (costs some speed).
+
+Budgets come from the environment, in megabytes:
+
+    MEMORY_SOFT_LIMIT_MB   evict caches, compact the in-memory history
+    MEMORY_HARD_LIMIT_MB   additionally archive old transaction log entries
+    MEMORY_CHECK_EVERY     check after every N saves (default 50)
+"""
+import os
+import sys
+import tracemalloc
+from types import FunctionType, MappingProxyType, MethodType, ModuleType
+
+_LEAF_TYPES = (str, bytes, bytearray, int, float, bool, type(None),
+               FunctionType, MethodType, ModuleType, type)
+
+
+def _slot_attributes(cls):
+    """Attribute names behind every ``__slots__`` entry of *cls* (mangled)."""
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for name in slots:
+            if name in ("__dict__", "__weakref__"):
+                continue
+            if name.startswith("__") and not name.endswith("__"):
+                name = f"_{klass.__name__.lstrip('_')}{name}"
+            yield name
+
+
+def deep_size(obj, seen: set = None) -> int:
+    """
+    Approximate bytes reachable from *obj* that are not already in *seen*.
+    Pass the same *seen* set to several calls to avoid counting shared
+    objects twice.  Functions, modules and classes count as leaves.
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, _LEAF_TYPES):
+            continue
+        if isinstance(obj, (dict, MappingProxyType)):
+            for key, value in obj.items():
+                stack.append(key)
+                stack.append(value)
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            for name in _slot_attributes(type(obj)):
+                try:
+                    stack.append(object.__getattribute__(obj, name))
+                except AttributeError:
+                    pass
+            try:
+                stack.append(object.__getattribute__(obj, "__dict__"))
+            except AttributeError:
+                pass
+    return total
+
+
+def process_rss():
+    """Resident set size in bytes, or ``None`` if the platform won't say."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def start_tracing_from_env() -> None:
+    if os.environ.get("MEMORY_TRACE") == "1" and not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+
+
+def tracemalloc_summary(limit: int = 10) -> dict:
+    """Current/peak traced bytes and the biggest allocation sites."""
+    if not tracemalloc.is_tracing():
+        return {"enabled": False}
+    current, peak = tracemalloc.get_traced_memory()
+    stats = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+    return {
+        "enabled": True,
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top": [
+            {"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+             "bytes": s.size, "blocks": s.count}
+            for s in stats
+        ],
+    }
+
+
+def _env_mb(name: str):
+    raw = os.environ.get(name, "").strip()
+    try:
+        return int(float(raw) * 1024 * 1024) if raw else None
+    except ValueError:
+        return None
+
+
+class MemoryBudget:
+    """Soft / hard byte limits, checked every ``check_every`` saves."""
+
+    def __init__(self, soft_bytes=None, hard_bytes=None, check_every: int = 50):
+        self.soft_bytes = soft_bytes
+        self.hard_bytes = hard_bytes
+        self.check_every = max(1, check_every)
+        self.last_actions = []      # what the last enforcement did
+        self._writes = 0
+
+    @classmethod
+    def from_env(cls) -> "MemoryBudget":
+        try:
+            check_every = int(os.environ.get("MEMORY_CHECK_EVERY", 50))
+        except ValueError:
+            check_every = 50
+        return cls(_env_mb("MEMORY_SOFT_LIMIT_MB"), _env_mb("MEMORY_HARD_LIMIT_MB"), check_every)
+
+    @property
+    def enabled(self) -> bool:
+        return self.soft_bytes is not None or self.hard_bytes is not None
+
+    def tick(self) -> bool:
+        """Count one save; True when it is time to check the budget."""
+        if not self.enabled:
+            return False
+        self._writes += 1
+        return self._writes % self.check_every == 0
+
+    def level(self, rss=None):
+        """``"hard"``, ``"soft"`` or ``None`` for the given (or current) RSS."""
+        if rss is None:
+            rss = process_rss()
+        if rss is None:
+            return None
+        if self.hard_bytes is not None and rss >= self.hard_bytes:
+            return "hard"
+        if self.soft_bytes is not None and rss >= self.soft_bytes:
+            return "soft"
+        return None
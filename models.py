@@ -0,0 +1,216 @@
+"""
+Compact in-memory representation of players and the goods catalog.
+
+City and item names are interned once in a ``Catalog`` and referred to by
+small integers everywhere else.  A ``Player`` keeps its cargo as an
+``array`` of item ids plus a bitmap of free slots, so the trade paths work
+on ints instead of scanning lists of strings.  Names only come back at the
+JSON / template boundary (``to_dict`` and ``cargo_names``).
+"""
+from array import array
+
+EMPTY = 0           # item id of an empty cargo slot
+NO_BASIS = -1       # purchase price / origin unknown (legacy cargo)
+
+
+class Catalog:
+    """Two-way mapping between city/item names and integer ids."""
+
+    __slots__ = ("item_ids", "item_names", "city_ids", "city_names")
+
+    def __init__(self):
+        self.item_ids = {"": EMPTY}
+        self.item_names = [""]
+        self.city_ids = {}
+        self.city_names = []
+
+    def item_id(self, name: str) -> int:
+        """Id for *name*, interning it on first sight."""
+        item_id = self.item_ids.get(name)
+        if item_id is None:
+            item_id = self.item_ids[name] = len(self.item_names)
+            self.item_names.append(name)
+        return item_id
+
+    def item_name(self, item_id: int) -> str:
+        return self.item_names[item_id]
+
+    def city_id(self, name: str) -> int:
+        city_id = self.city_ids.get(name)
+        if city_id is None:
+            city_id = self.city_ids[name] = len(self.city_names)
+            self.city_names.append(name)
+        return city_id
+
+    def city_name(self, city_id: int) -> str:
+        return self.city_names[city_id]
+
+    def add_prices(self, city_prices: dict) -> None:
+        """Intern every city and item of a price table."""
+        for city, goods in city_prices.items():
+            self.city_id(city)
+            for item in goods:
+                self.item_id(item)
+
+
+class ProfitLoss:
+    """
+    Running realized profit & loss of one player, updated in O(1) per trade.
+
+    ``items``  – item id → ``[bought, spent, sold, revenue, cost]``
+    ``routes`` – ``(buy city id, sell city id)`` → ``[sold, revenue, cost]``
+
+    Sales are matched to the lot stored in the sold cargo slot.  A slot
+    holds a single unit, so that lot is exactly the unit being sold.
+    Cargo loaded before tracking existed has no basis and is only counted
+    in ``unmatched_sales``.
+    """
+
+    __slots__ = ("realized", "written_off", "unmatched_sales", "items", "routes")
+
+    def __init__(self):
+        self.realized = 0
+        self.written_off = 0
+        self.unmatched_sales = 0
+        self.items = {}
+        self.routes = {}
+
+    def record_buy(self, item_id: int, price: int) -> None:
+        stats = self.items.get(item_id)
+        if stats is None:
+            stats = self.items[item_id] = [0, 0, 0, 0, 0]
+        stats[0] += 1
+        stats[1] += price
+
+    def record_sale(self, item_id: int, price: int, city_id: int, basis: int, origin: int) -> None:
+        if basis == NO_BASIS:
+            self.unmatched_sales += 1
+            return
+        stats = self.items.get(item_id)
+        if stats is None:
+            stats = self.items[item_id] = [0, 0, 0, 0, 0]
+        stats[2] += 1
+        stats[3] += price
+        stats[4] += basis
+        route = self.routes.get((origin, city_id))
+        if route is None:
+            route = self.routes[(origin, city_id)] = [0, 0, 0]
+        route[0] += 1
+        route[1] += price
+        route[2] += basis
+        self.realized += price - basis
+
+    def record_write_off(self, basis: int) -> None:
+        if basis != NO_BASIS:
+            self.written_off += basis
+
+    # -- JSON boundary -------------------------------------------------
+    @classmethod
+    def from_dict(cls, data: dict, catalog: "Catalog") -> "ProfitLoss":
+        pnl = cls()
+        pnl.realized = data.get("realized", 0)
+        pnl.written_off = data.get("written_off", 0)
+        pnl.unmatched_sales = data.get("unmatched_sales", 0)
+        pnl.items = {catalog.item_id(name): list(stats) for name, stats in data.get("items", {}).items()}
+        pnl.routes = {
+            (catalog.city_id(src), catalog.city_id(dst)): list(stats)
+            for src, dst, *stats in data.get("routes", [])
+        }
+        return pnl
+
+    def to_dict(self, catalog: "Catalog") -> dict:
+        return {
+            "realized": self.realized,
+            "written_off": self.written_off,
+            "unmatched_sales": self.unmatched_sales,
+            "items": {catalog.item_name(i): stats for i, stats in self.items.items()},
+            "routes": [
+                [catalog.city_name(src), catalog.city_name(dst), *stats]
+                for (src, dst), stats in self.routes.items()
+            ],
+        }
+
+
+class Player:
+    """One trader: balance, truck capacity, cargo slots, P&L and log."""
+
+    __slots__ = ("money", "capacity", "cargo", "free", "basis", "origin",
+                 "pnl", "transaction_log")
+
+    def __init__(self, money: int, capacity: int = 2, cargo=None, transaction_log=None):
+        self.money = money
+        self.capacity = capacity
+        self.cargo = array("H", cargo if cargo is not None else [EMPTY] * capacity)
+        while len(self.cargo) < capacity:
+            self.cargo.append(EMPTY)
+        self.free = 0                   # bit i set ⇔ slot i is empty
+        for slot, item_id in enumerate(self.cargo):
+            if item_id == EMPTY:
+                self.free |= 1 << slot
+        self.basis = array("q", [NO_BASIS] * len(self.cargo))   # purchase price per slot
+        self.origin = array("h", [NO_BASIS] * len(self.cargo))  # city id bought in
+        self.pnl = ProfitLoss()
+        self.transaction_log = transaction_log if transaction_log is not None else []
+
+    # -- JSON boundary -------------------------------------------------
+    @classmethod
+    def from_dict(cls, data: dict, catalog: Catalog) -> "Player":
+        capacity = data.get("capacity", 2)
+        cargo = [catalog.item_id(item) if item else EMPTY for item in data.get("cargo", [])]
+        player = cls(data.get("money", 0), capacity, cargo, list(data.get("transaction_log", [])))
+        for slot, lot in enumerate(data.get("cost_basis", [])[:len(player.cargo)]):
+            if lot and player.cargo[slot] != EMPTY:
+                player.basis[slot] = lot[0]
+                player.origin[slot] = catalog.city_id(lot[1])
+        if "pnl" in data:
+            player.pnl = ProfitLoss.from_dict(data["pnl"], catalog)
+        return player
+
+    def to_dict(self, catalog: Catalog) -> dict:
+        return {
+            "money": self.money,
+            "capacity": self.capacity,
+            "cargo": self.cargo_names(catalog),
+            "cost_basis": [
+                [basis, catalog.city_name(origin)] if basis != NO_BASIS else None
+                for basis, origin in zip(self.basis, self.origin)
+            ],
+            "pnl": self.pnl.to_dict(catalog),
+            "transaction_log": self.transaction_log,
+        }
+
+    def cargo_names(self, catalog: Catalog) -> list:
+        names = catalog.item_names
+        return [names[item_id] for item_id in self.cargo]
+
+    # -- cargo slots ---------------------------------------------------
+    def first_free_slot(self) -> int:
+        """Lowest empty slot index, or -1 when the truck is full."""
+        free = self.free
+        return (free & -free).bit_length() - 1
+
+    def put(self, slot: int, item_id: int, basis: int = NO_BASIS, origin: int = NO_BASIS) -> None:
+        """Load *item_id* into *slot*, remembering what it cost and where."""
+        self.cargo[slot] = item_id
+        if item_id == EMPTY:
+            self.free |= 1 << slot
+            basis = origin = NO_BASIS
+        else:
+            self.free &= ~(1 << slot)
+        self.basis[slot] = basis
+        self.origin[slot] = origin
+
+    def take(self, slot: int) -> int:
+        """Empty *slot* and return the item id that was in it."""
+        item_id = self.cargo[slot]
+        self.cargo[slot] = EMPTY
+        self.basis[slot] = self.origin[slot] = NO_BASIS
+        self.free |= 1 << slot
+        return item_id
+
+    def add_slot(self) -> None:
+        self.free |= 1 << len(self.cargo)
+        self.cargo.append(EMPTY)
+        self.basis.append(NO_BASIS)
+        self.origin.append(NO_BASIS)
+        self.capacity += 1
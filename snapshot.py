@@ -0,0 +1,89 @@
+"""
+Copy-on-write snapshots of the game state.
+
+Writers mutate the live ``Player`` objects and price dicts while holding
+the app's write lock, then ``publish`` a new ``GameSnapshot``.  Readers
+grab the current snapshot with a single global read – no lock – and may
+iterate it for as long as they like while trading carries on.
+
+Publishing is cheap because unchanged parts are shared with the previous
+snapshot: a player view is reused when balance, capacity, cargo and log
+length are unchanged, and so is an unchanged price table.  Transaction
+logs are append-only, so a view shares the live list and records how much
+of it belongs to the snapshot (``log_length``).  Code that rewrites a log
+must assign a new list instead of editing the old one in place.
+"""
+from types import MappingProxyType
+from typing import NamedTuple
+
+
+class PlayerView(NamedTuple):
+    money: int
+    capacity: int
+    cargo: tuple            # item names, "" for empty slots
+    cargo_ids: bytes        # raw item ids, for cheap change detection
+    log: list               # live, append-only log – read only log[:log_length]
+    log_length: int
+
+    @property
+    def cargo_used(self) -> int:
+        return sum(1 for item in self.cargo if item)
+
+    @property
+    def transaction_log(self) -> list:
+        """Copy of this snapshot's part of the log."""
+        return self.log[:self.log_length]
+
+
+class GameSnapshot(NamedTuple):
+    version: int
+    players: MappingProxyType           # name → PlayerView
+    city_prices: MappingProxyType       # city → read-only {item: price}
+    closed_cities: tuple
+    selected_city: str
+    vogn_settings: MappingProxyType
+
+
+EMPTY_SNAPSHOT = GameSnapshot(0, MappingProxyType({}), MappingProxyType({}), (), "",
+                              MappingProxyType({}))
+
+
+def player_view(player, catalog, previous: PlayerView = None) -> PlayerView:
+    """Immutable view of *player*, reusing *previous* if nothing changed."""
+    cargo_ids = player.cargo.tobytes()
+    log = player.transaction_log
+    if (previous is not None
+            and previous.log is log
+            and previous.log_length == len(log)
+            and previous.money == player.money
+            and previous.capacity == player.capacity
+            and previous.cargo_ids == cargo_ids):
+        return previous
+    return PlayerView(player.money, player.capacity, tuple(player.cargo_names(catalog)),
+                      cargo_ids, log, len(log))
+
+
+def publish(previous: GameSnapshot, players: dict, city_prices: dict, closed_cities,
+            selected_city: str, vogn_settings: dict, catalog) -> GameSnapshot:
+    """Next snapshot, sharing every unchanged part of *previous*."""
+    old_players = previous.players
+    views = {name: player_view(p, catalog, old_players.get(name)) for name, p in players.items()}
+
+    old_prices = previous.city_prices
+    prices = {}
+    for city, goods in city_prices.items():
+        old = old_prices.get(city)
+        prices[city] = old if old is not None and old == goods else MappingProxyType(dict(goods))
+
+    settings = previous.vogn_settings
+    if settings != vogn_settings:
+        settings = MappingProxyType(dict(vogn_settings))
+
+    return GameSnapshot(
+        previous.version + 1,
+        MappingProxyType(views),
+        MappingProxyType(prices),
+        tuple(closed_cities),
+        selected_city,
+        settings,
+    )
@@ -0,0 +1,51 @@
+import unittest
+
+import balance
+from engine import DEFAULT_CITY_PRICES_EU
+
+
+def params(**overrides):
+    base = {
+        "start_cost": 5000,
+        "upgrade_step": 7500,
+        "price_scale": 1.0,
+        "city_prices": DEFAULT_CITY_PRICES_EU,
+        "strategies": ["greedy", "random"],
+        "players_per_strategy": 2,
+        "turns": 40,
+    }
+    base.update(overrides)
+    return base
+
+
+class BalanceTests(unittest.TestCase):
+    def test_games_are_reproducible_per_seed(self):
+        self.assertEqual(balance.simulate_game(params(), 7), balance.simulate_game(params(), 7))
+
+    def test_summary_reports_wealth_upgrades_and_popularity(self):
+        summary = balance.summarize(params(), balance.simulate_batch(params(), [1, 2, 3]))
+
+        greedy = summary["strategies"]["greedy"]
+        self.assertEqual(greedy["players"], 6)
+        self.assertLessEqual(greedy["wealth_p10"], greedy["wealth_p50"])
+        self.assertLessEqual(greedy["wealth_p50"], greedy["wealth_p90"])
+        self.assertIsNotNone(greedy["first_upgrade_p50"])
+        self.assertAlmostEqual(sum(summary["item_popularity"].values()), 1.0, places=2)
+
+    def test_unaffordable_upgrades_are_never_taken(self):
+        results = balance.simulate_game(params(start_cost=10 ** 9), 3)
+
+        self.assertTrue(all(r["first_upgrade"] is None and r["capacity"] == 2 for r in results))
+
+    def test_free_upgrades_do_not_hang_the_simulation(self):
+        results = balance.simulate_game(params(start_cost=0, upgrade_step=0, turns=10), 3)
+
+        self.assertTrue(all(r["capacity"] <= 2 + 10 for r in results))
+
+    def test_sweep_with_free_upgrades_is_rejected(self):
+        with self.assertRaises(SystemExit):
+            balance.parse_args(["--start-cost", "0", "--upgrade-step", "0", "5000"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+import bench
+
+
+class BenchTests(unittest.TestCase):
+    def test_synthetic_game_has_requested_trades_in_time_order(self):
+        data = bench.synthetic_game(players=3, trades=50, spread_hours=2, seed=1)
+
+        self.assertEqual(len(data["players"]), 3)
+        records = [e for p in data["players"].values() for e in p["transaction_log"] if isinstance(e, dict)]
+        self.assertEqual(len(records), 50)
+        for p in data["players"].values():
+            stamps = [e["ts"] for e in p["transaction_log"] if isinstance(e, dict)]
+            self.assertEqual(stamps, sorted(stamps))
+
+    def test_run_reports_every_bench_per_size(self):
+        report = bench.run(bench.parse_args(["--players", "2", "--trades", "10", "20", "--repeat", "1"]))
+
+        names = {row["bench"] for row in report["results"]}
+        self.assertIn("render_index", names)
+        self.assertIn("load_game_state", names)
+        self.assertEqual(len(report["results"]), 2 * len(names))
+
+
+if __name__ == "__main__":
+    unittest.main()
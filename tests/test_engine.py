@@ -0,0 +1,48 @@
+import unittest
+
+import engine
+from engine import GameState, TradeError
+from models import Player
+
+
+def make_game(**kwargs):
+    prices = {"Tokyo": {"Nudler": 900}, "Osaka": {"Nudler": 1100}, engine.UPGRADE_CITY: {}}
+    players = {"Aiko": Player(10000, 2)}
+    return GameState(players, prices, **kwargs)
+
+
+class EngineTests(unittest.TestCase):
+    def test_buy_then_sell_moves_money_and_cargo(self):
+        game = make_game()
+
+        engine.buy(game, "Aiko", "Tokyo", "Nudler")
+        item, price = engine.sell(game, "Aiko", "Osaka", 0)
+
+        player = game.players["Aiko"]
+        self.assertEqual((item, price), ("Nudler", 1100))
+        self.assertEqual(player.money, 10200)
+        self.assertEqual(player.first_free_slot(), 0)
+        self.assertEqual(len(player.transaction_log), 4)
+
+    def test_refused_actions_raise_trade_error(self):
+        game = make_game(closed_cities=["Osaka"])
+
+        with self.assertRaises(TradeError):
+            engine.sell(game, "Aiko", "Tokyo", 0)
+        engine.buy(game, "Aiko", "Tokyo", "Nudler")
+        with self.assertRaisesRegex(TradeError, "lukket"):
+            engine.sell(game, "Aiko", "Osaka", 0)
+        with self.assertRaisesRegex(TradeError, "værksted"):
+            engine.upgrade(game, "Aiko", "Tokyo")
+
+    def test_upgrade_cost_grows_with_capacity(self):
+        game = make_game(log_trades=False)
+
+        self.assertEqual(engine.upgrade(game, "Aiko", engine.UPGRADE_CITY), 5000)
+        self.assertEqual(engine.upgrade_cost(game.vogn_settings, 3), 12500)
+        self.assertEqual(game.players["Aiko"].capacity, 3)
+        self.assertEqual(game.players["Aiko"].transaction_log, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
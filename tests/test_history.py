@@ -0,0 +1,131 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from history import GameHistory
+
+
+def make_state(money, cargo, closed=()):
+    return {
+        "players": {"Player 1": {"money": money, "capacity": len(cargo), "cargo": list(cargo)}},
+        "city_prices": {"Tokyo": {"Nudler": 900}},
+        "closed_cities": list(closed),
+    }
+
+
+class GameHistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "history.ndjson"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def record_trades(self, history, count):
+        history.capture(make_state(10000, ["", ""]), "2024-05-01T12:00:00+00:00")
+        for minute in range(1, count + 1):
+            history.capture(make_state(10000 - minute, ["Nudler", ""]),
+                            f"2024-05-01T12:{minute:02d}:00+00:00")
+
+    def test_state_at_replays_from_nearest_checkpoint(self):
+        history = GameHistory(self.path, checkpoint_interval=5)
+        self.record_trades(history, 20)
+
+        state, checkpoint_ts, replayed = history.state_at("2024-05-01T12:13:30+00:00")
+
+        self.assertEqual(state["players"]["Player 1"]["money"], 10000 - 13)
+        self.assertEqual(checkpoint_ts, "2024-05-01T12:10:00+00:00")
+        self.assertLessEqual(replayed, 5)
+
+    def test_unchanged_state_records_no_events(self):
+        history = GameHistory(self.path)
+        history.capture(make_state(10000, ["", ""]), "2024-05-01T12:00:00+00:00")
+
+        written = history.capture(make_state(10000, ["", ""]), "2024-05-01T12:01:00+00:00")
+
+        self.assertEqual(written, 0)
+        self.assertEqual(history.events, [])
+
+    def test_history_is_reloaded_from_disk(self):
+        history = GameHistory(self.path, checkpoint_interval=5)
+        self.record_trades(history, 12)
+        history.capture(make_state(5, ["", ""], closed=["Tokyo"]), "2024-05-01T13:00:00+00:00")
+
+        reloaded = GameHistory(self.path, checkpoint_interval=5)
+        state, _, _ = reloaded.state_at("2024-05-01T12:07:00+00:00")
+
+        self.assertEqual(state["players"]["Player 1"]["money"], 10000 - 7)
+        self.assertEqual(reloaded.state_at("2024-05-01T13:00:00+00:00")[0]["closed_cities"], ["Tokyo"])
+        self.assertEqual(reloaded.capture(make_state(5, ["", ""], closed=["Tokyo"]),
+                                         "2024-05-01T13:01:00+00:00"), 0)
+
+    def test_compacted_history_is_read_back_from_disk(self):
+        history = GameHistory(self.path, checkpoint_interval=5)
+        self.record_trades(history, 20)
+
+        dropped = history.compact(keep_checkpoints=2)
+
+        self.assertEqual(dropped, 15)
+        self.assertEqual(len(history.checkpoints), 2)
+        self.assertEqual(history.state_at("2024-05-01T12:17:00+00:00")[0]["players"]["Player 1"]["money"],
+                         10000 - 17)
+        state, checkpoint_ts, replayed = history.state_at("2024-05-01T12:07:00+00:00")
+        self.assertEqual(state["players"]["Player 1"]["money"], 10000 - 7)
+        self.assertEqual((checkpoint_ts, replayed), ("2024-05-01T12:05:00+00:00", 2))
+        self.assertIsNone(history.state_at("2024-05-01T11:59:00+00:00"))
+        self.assertEqual(history.capture(make_state(1, ["", ""]), "2024-05-01T12:30:00+00:00"), 1)
+
+    def test_torn_last_write_does_not_swallow_the_next_one(self):
+        self.record_trades(GameHistory(self.path, checkpoint_interval=50), 4)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write('{"seq":5,"ts":"2024-05-01T12:05:00+00:00","type":"pla')
+
+        history = GameHistory(self.path, checkpoint_interval=50)
+        for minute in (5, 6):
+            history.capture(make_state(10000 - minute, ["Nudler", ""]), f"2024-05-01T12:{minute:02d}:00+00:00")
+        reloaded = GameHistory(self.path, checkpoint_interval=50)
+
+        self.assertEqual(reloaded.state_at("2024-05-01T12:06:00+00:00")[0]["players"]["Player 1"]["money"],
+                         10000 - 6)
+        self.assertEqual(reloaded.next_seq, history.next_seq)
+
+    def test_compacted_interval_with_a_torn_line_is_still_readable(self):
+        self.record_trades(GameHistory(self.path, checkpoint_interval=5), 12)
+        lines = self.path.read_text(encoding="utf-8").splitlines(keepends=True)
+        lines.insert(2, '{"seq": 1, "ts": "2024-05\n')     # torn write inside the first interval
+        self.path.write_text("".join(lines), encoding="utf-8")
+        history = GameHistory(self.path, checkpoint_interval=5)
+        history.compact(keep_checkpoints=1)
+
+        state, _, _ = history.state_at("2024-05-01T12:03:30+00:00")
+
+        self.assertEqual(state["players"]["Player 1"]["money"], 10000 - 3)
+
+    def test_queries_stay_correct_while_capturing_and_compacting(self):
+        history = GameHistory(self.path, checkpoint_interval=3)
+        self.record_trades(history, 30)
+        errors = []
+
+        def writer():
+            for minute in range(31, 60):
+                history.capture(make_state(10000 - minute, ["Nudler", ""]),
+                                f"2024-05-01T12:{minute:02d}:00+00:00")
+                history.compact(keep_checkpoints=1)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        while True:
+            for minute in (2, 14, 29):
+                money = history.state_at(f"2024-05-01T12:{minute:02d}:30+00:00")[0]["players"]["Player 1"]["money"]
+                if money != 10000 - minute:
+                    errors.append((minute, money))
+            if not thread.is_alive():
+                break
+        thread.join()
+
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
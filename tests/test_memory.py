@@ -0,0 +1,44 @@
+import sys
+import unittest
+
+from memory import MemoryBudget, deep_size
+from models import Player
+
+
+class DeepSizeTests(unittest.TestCase):
+    def test_counts_nested_containers_and_slotted_objects(self):
+        log = ["Købte Nudler", {"ts": "2025-01-01T00:00:00+00:00", "money": 9100}]
+        player = Player(10000)
+        player.transaction_log = log
+
+        self.assertGreater(deep_size(player), deep_size(log))
+        self.assertGreaterEqual(deep_size(log), sys.getsizeof(log) + sys.getsizeof(log[0]))
+
+    def test_shared_objects_are_counted_once(self):
+        shared = list(range(1000))
+        seen = set()
+
+        first = deep_size({"a": shared}, seen)
+        second = deep_size({"b": shared}, seen)
+
+        self.assertLess(second, first)
+
+
+class MemoryBudgetTests(unittest.TestCase):
+    def test_levels_and_check_interval(self):
+        budget = MemoryBudget(soft_bytes=100, hard_bytes=200, check_every=2)
+
+        self.assertEqual([budget.tick(), budget.tick()], [False, True])
+        self.assertIsNone(budget.level(50))
+        self.assertEqual(budget.level(150), "soft")
+        self.assertEqual(budget.level(250), "hard")
+
+    def test_disabled_without_limits(self):
+        budget = MemoryBudget()
+
+        self.assertFalse(budget.enabled)
+        self.assertFalse(budget.tick())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from models import EMPTY, NO_BASIS, Catalog, Player
+
+
+class PlayerTests(unittest.TestCase):
+    def setUp(self):
+        self.catalog = Catalog()
+        self.catalog.add_prices({"Tokyo": {"Nudler": 900, "Sake": 4000}})
+
+    def test_round_trip_keeps_names_at_the_json_boundary(self):
+        data = {
+            "money": 500,
+            "capacity": 3,
+            "cargo": ["Sake", "", "Nudler"],
+            "cost_basis": [[4000, "Tokyo"], None, [900, "Tokyo"]],
+            "pnl": {
+                "realized": 200,
+                "written_off": 0,
+                "unmatched_sales": 1,
+                "items": {"Nudler": [2, 1800, 1, 1100, 900]},
+                "routes": [["Tokyo", "Tokyo", 1, 1100, 900]],
+            },
+            "transaction_log": ["x"],
+        }
+
+        player = Player.from_dict(data, self.catalog)
+
+        self.assertEqual(player.cargo.typecode, "H")
+        self.assertEqual(player.to_dict(self.catalog), data)
+
+    def test_free_slot_bitmap_tracks_put_take_and_upgrade(self):
+        player = Player(1000, 2)
+        nudler = self.catalog.item_id("Nudler")
+
+        player.put(player.first_free_slot(), nudler)
+        player.put(player.first_free_slot(), nudler)
+        self.assertEqual(player.first_free_slot(), -1)
+
+        player.add_slot()
+        self.assertEqual(player.first_free_slot(), 2)
+        self.assertEqual(player.take(0), nudler)
+        self.assertEqual(player.first_free_slot(), 0)
+        self.assertEqual(list(player.cargo), [EMPTY, nudler, EMPTY])
+
+    def test_short_cargo_is_padded_to_capacity(self):
+        player = Player.from_dict({"money": 0, "capacity": 3, "cargo": ["Sake"]}, self.catalog)
+
+        self.assertEqual(player.cargo_names(self.catalog), ["Sake", "", ""])
+        self.assertEqual(player.first_free_slot(), 1)
+
+    def test_profit_is_realized_against_the_sold_slots_lot(self):
+        player = Player(1000, 2)
+        nudler = self.catalog.item_id("Nudler")
+        tokyo, osaka = self.catalog.city_id("Tokyo"), self.catalog.city_id("Osaka")
+        player.put(0, nudler, 900, tokyo)
+        player.put(1, nudler, 700, osaka)
+
+        basis, origin = player.basis[1], player.origin[1]
+        player.take(1)
+        player.pnl.record_sale(nudler, 1000, tokyo, basis, origin)
+
+        self.assertEqual(player.pnl.realized, 300)
+        self.assertEqual(player.pnl.routes, {(osaka, tokyo): [1, 1000, 700]})
+        self.assertEqual(player.basis[1], NO_BASIS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from models import Catalog, Player
+from snapshot import EMPTY_SNAPSHOT, publish
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.prices = {"Tokyo": {"Nudler": 900}, "Osaka": {"Nudler": 1100}}
+        self.catalog = Catalog()
+        self.catalog.add_prices(self.prices)
+        self.players = {"Aiko": Player(10000), "Hana": Player(10000)}
+        self.closed = []
+
+    def publish(self, previous=EMPTY_SNAPSHOT):
+        return publish(previous, self.players, self.prices, self.closed, "Tokyo",
+                       {"start_cost": 5000, "upgrade_step": 7500}, self.catalog)
+
+    def test_old_snapshot_is_unaffected_by_later_writes(self):
+        before = self.publish()
+
+        aiko = self.players["Aiko"]
+        aiko.put(0, self.catalog.item_id("Nudler"))
+        aiko.money -= 900
+        aiko.transaction_log.append("Købte Nudler")
+        self.players["Kenji"] = Player(10000)
+        self.prices["Tokyo"]["Nudler"] = 950
+        after = self.publish(before)
+
+        self.assertEqual(before.players["Aiko"].money, 10000)
+        self.assertEqual(before.players["Aiko"].cargo, ("", ""))
+        self.assertEqual(before.players["Aiko"].transaction_log, [])
+        self.assertNotIn("Kenji", before.players)
+        self.assertEqual(before.city_prices["Tokyo"]["Nudler"], 900)
+        self.assertEqual(after.players["Aiko"].cargo, ("Nudler", ""))
+        self.assertEqual(after.version, before.version + 1)
+
+    def test_unchanged_parts_are_shared_between_versions(self):
+        before = self.publish()
+
+        self.players["Aiko"].money += 1
+        after = self.publish(before)
+
+        self.assertIsNot(after.players["Aiko"], before.players["Aiko"])
+        self.assertIs(after.players["Hana"], before.players["Hana"])
+        self.assertIs(after.city_prices["Osaka"], before.city_prices["Osaka"])
+        self.assertIs(after.vogn_settings, before.vogn_settings)
+
+    def test_snapshot_cannot_be_mutated(self):
+        snap = self.publish()
+
+        with self.assertRaises(TypeError):
+            snap.city_prices["Tokyo"]["Nudler"] = 1
+        with self.assertRaises(TypeError):
+            snap.players["Aiko"] = None
+
+
+if __name__ == "__main__":
+    unittest.main()
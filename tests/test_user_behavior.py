@@ -1,17 +1,22 @@
 import copy
+import gzip
+import json
 import tempfile
 import unittest
 from pathlib import Path
 
 import app as truckerspil_app
+from history import GameHistory
 
 
 class UserBehaviorTests(unittest.TestCase):
     def setUp(self):
         self.temp_dir = tempfile.TemporaryDirectory()
         truckerspil_app.BACKUP_FILE = Path(self.temp_dir.name) / "game_state.json"
+        truckerspil_app.history = GameHistory(Path(self.temp_dir.name) / "game_history.ndjson")
+        truckerspil_app.LOG_ARCHIVE_FILE = Path(self.temp_dir.name) / "game_log_archive.ndjson"
 
-        truckerspil_app.players = copy.deepcopy(truckerspil_app.DEFAULT_PLAYERS)
+        truckerspil_app.players = truckerspil_app.build_players(copy.deepcopy(truckerspil_app.DEFAULT_PLAYERS))
         truckerspil_app.selected_city = "Tokyo"
         truckerspil_app.selected_player = "Player 1"
         truckerspil_app.city_prices = copy.deepcopy(truckerspil_app.DEFAULT_CITY_PRICES_EU)
@@ -19,6 +24,7 @@ class UserBehaviorTests(unittest.TestCase):
         truckerspil_app.closed_cities = []
         truckerspil_app.vogn_settings = copy.deepcopy(truckerspil_app.DEFAULT_VOGN_SETTINGS)
         truckerspil_app.cities = list(truckerspil_app.city_prices.keys())
+        truckerspil_app.publish_snapshot()
 
         self.client = truckerspil_app.app.test_client()
 
@@ -64,14 +70,14 @@ class UserBehaviorTests(unittest.TestCase):
         player = truckerspil_app.players["Player 1"]
 
         self.assertTrue(payload["success"])
-        self.assertEqual(player["cargo"][0], "Nudler")
-        self.assertEqual(player["money"], 9100)
-        self.assertTrue(any("Købte Nudler" in entry for entry in player["transaction_log"] if isinstance(entry, str)))
+        self.assertEqual(player.cargo_names(truckerspil_app.catalog)[0], "Nudler")
+        self.assertEqual(player.money, 9100)
+        self.assertTrue(any("Købte Nudler" in entry for entry in player.transaction_log if isinstance(entry, str)))
 
     def test_sell_item_updates_money_cargo_and_log(self):
         player = truckerspil_app.players["Player 1"]
-        player["cargo"][0] = "Nudler"
-        player["money"] = 5000
+        player.put(0, truckerspil_app.catalog.item_id("Nudler"))
+        player.money = 5000
 
         response = self.client.post(
             "/sell",
@@ -81,13 +87,13 @@ class UserBehaviorTests(unittest.TestCase):
         payload = response.get_json()
 
         self.assertTrue(payload["success"])
-        self.assertEqual(player["cargo"][0], "")
-        self.assertEqual(player["money"], 5900)
-        self.assertTrue(any("Solgte Nudler" in entry for entry in player["transaction_log"] if isinstance(entry, str)))
+        self.assertEqual(player.cargo_names(truckerspil_app.catalog)[0], "")
+        self.assertEqual(player.money, 5900)
+        self.assertTrue(any("Solgte Nudler" in entry for entry in player.transaction_log if isinstance(entry, str)))
 
     def test_clear_item_empties_cargo_slot(self):
         player = truckerspil_app.players["Player 1"]
-        player["cargo"][0] = "Nudler"
+        player.put(0, truckerspil_app.catalog.item_id("Nudler"))
 
         response = self.client.post(
             "/clear",
@@ -97,7 +103,7 @@ class UserBehaviorTests(unittest.TestCase):
         payload = response.get_json()
 
         self.assertTrue(payload["success"])
-        self.assertEqual(player["cargo"][0], "")
+        self.assertEqual(player.cargo_names(truckerspil_app.catalog)[0], "")
 
     def test_upgrade_truck_in_workshop_increases_capacity_and_deducts_money(self):
         player = truckerspil_app.players["Player 1"]
@@ -111,9 +117,9 @@ class UserBehaviorTests(unittest.TestCase):
         payload = response.get_json()
 
         self.assertTrue(payload["success"])
-        self.assertEqual(player["capacity"], 3)
-        self.assertEqual(len(player["cargo"]), 3)
-        self.assertEqual(player["money"], 5000)
+        self.assertEqual(player.capacity, 3)
+        self.assertEqual(len(player.cargo), 3)
+        self.assertEqual(player.money, 5000)
 
     def test_upgrade_truck_fails_outside_workshop(self):
         player = truckerspil_app.players["Player 1"]
@@ -127,12 +133,12 @@ class UserBehaviorTests(unittest.TestCase):
         payload = response.get_json()
 
         self.assertFalse(payload["success"])
-        self.assertEqual(player["capacity"], 2)
+        self.assertEqual(player.capacity, 2)
         self.assertIn(truckerspil_app.UPGRADE_CITY, payload["message"])
 
     def test_upgrade_truck_fails_when_player_cannot_afford_it(self):
         player = truckerspil_app.players["Player 1"]
-        player["money"] = 4999
+        player.money = 4999
         truckerspil_app.selected_city = truckerspil_app.UPGRADE_CITY
 
         response = self.client.post(
@@ -143,9 +149,319 @@ class UserBehaviorTests(unittest.TestCase):
         payload = response.get_json()
 
         self.assertFalse(payload["success"])
-        self.assertEqual(player["capacity"], 2)
+        self.assertEqual(player.capacity, 2)
         self.assertIn("ikke yen nok", payload["message"])
 
+    def test_money_series_is_gzipped_when_client_accepts_it(self):
+        response = self.client.get("/money_series", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        series = json.loads(gzip.decompress(response.get_data()))
+        self.assertIn("Player 1", series)
+
+    def test_static_assets_use_fingerprinted_immutable_urls(self):
+        html = self.client.get("/").get_data(as_text=True)
+        digest = truckerspil_app.static_fingerprint("style.css")
+
+        self.assertIn(f"/static/style.css?v={digest}", html)
+        response = self.client.get(f"/static/style.css?v={digest}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+        response.close()
+
+    def test_admin_batch_applies_all_operations_with_one_save(self):
+        save_calls = []
+        original_save = truckerspil_app.save_game_state
+        truckerspil_app.save_game_state = lambda: save_calls.append(1) or original_save()
+        self.addCleanup(setattr, truckerspil_app, "save_game_state", original_save)
+
+        response = self.client.post("/admin/batch", json=[
+            {"op": "price", "city": "Osaka", "item": "Tun", "price": 6000},
+            {"op": "money", "player": "Player 2", "delta": -500},
+            {"op": "close", "city": "Kobe"},
+            {"op": "add_player", "player": "Hana"},
+            {"op": "rename_player", "player": "Player 1", "new_name": "Aiko"},
+            {"op": "delete_player", "player": "Player 4"},
+        ])
+
+        self.assertTrue(response.get_json()["success"])
+        self.assertEqual(len(save_calls), 1)
+        self.assertEqual(truckerspil_app.city_prices["Osaka"]["Tun"], 6000)
+        self.assertEqual(truckerspil_app.players["Player 2"].money, 9500)
+        self.assertIn("Kobe", truckerspil_app.closed_cities)
+        self.assertIn("Hana", truckerspil_app.players)
+        self.assertEqual(truckerspil_app.selected_player, "Aiko")
+        self.assertNotIn("Player 4", truckerspil_app.players)
+
+    def test_admin_batch_rejects_whole_batch_on_any_error(self):
+        csv_body = (
+            "op,city,item,price,player,delta\n"
+            "price,Tokyo,Nudler,950,,\n"
+            "money,,,,Nobody,100\n"
+        )
+
+        response = self.client.post("/admin/batch", data=csv_body, content_type="text/csv")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Nobody", response.get_json()["errors"][0])
+        self.assertEqual(truckerspil_app.city_prices["Tokyo"]["Nudler"], 900)
+
+    def test_state_at_returns_reconstructed_cargo_and_money(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.post("/buy", data={"player": "Player 1", "item": "Sake"})
+
+        response = self.client.get("/admin/state_at", query_string={
+            "ts": truckerspil_app.iso_now(), "player": "Player 1",
+        })
+
+        payload = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(payload["state"]["players"]["Player 1"]["cargo"], ["Nudler", "Sake"])
+        self.assertEqual(payload["state"]["players"]["Player 1"]["money"], 5100)
+        self.assertEqual(list(payload["state"]["players"]), ["Player 1"])
+
+    def test_state_at_before_any_history_is_not_found(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+
+        response = self.client.get("/admin/state_at?ts=2000-01-01T00:00:00Z")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_streams_filtered_ndjson(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.post("/buy", data={"player": "Player 2", "item": "Sake"})
+
+        response = self.client.get("/admin/export?format=ndjson&player=Player%201")
+
+        self.assertTrue(response.is_streamed)
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["player"], "Player 1")
+        self.assertEqual(rows[0]["money"], 9100)
+        self.assertIn("Købte Nudler", rows[0]["entry"])
+
+    def test_export_csv_honours_time_range(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+
+        response = self.client.get("/admin/export?format=csv&end=2000-01-01T00:00:00Z")
+
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines, ["player,ts,money,entry"])
+
+    def test_admin_dashboard_bundles_series_popularity_roster_and_cities(self):
+        truckerspil_app.closed_cities = ["Kobe"]
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        truckerspil_app.selected_city = "Osaka"
+        self.client.post("/sell", data={"player": "Player 1", "space": "1"})
+
+        payload = self.client.get("/admin/dashboard?pop_hours=0.5").get_json()
+
+        self.assertEqual(payload["money_series"]["Player 1"][-1][1], 10200)
+        self.assertEqual(payload["popularity"]["per_city"], {"Osaka": {"Nudler": 1}})
+        roster = {row["player"]: row for row in payload["roster"]}
+        self.assertEqual(roster["Player 1"]["money"], 10200)
+        self.assertEqual(roster["Player 1"]["log_entries"], 2)
+        self.assertIn({"city": "Kobe", "closed": True, "items": 6}, payload["cities"])
+
+    def test_player_stats_reports_realized_profit_per_item_and_route(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.post("/buy", data={"player": "Player 1", "item": "Sake"})
+        truckerspil_app.selected_city = "Osaka"
+        self.client.post("/sell", data={"player": "Player 1", "space": "1"})
+        self.client.post("/clear", data={"player": "Player 1", "space": "2"})
+
+        stats = self.client.get("/p/Player 1/stats").get_json()
+
+        self.assertEqual(stats["realized_profit"], 200)
+        self.assertEqual(stats["written_off"], 4000)
+        self.assertEqual(stats["items"]["Nudler"]["profit"], 200)
+        self.assertEqual(stats["items"]["Sake"]["bought"], 1)
+        self.assertEqual(stats["routes"], [
+            {"from": "Tokyo", "to": "Osaka", "sold": 1, "revenue": 1100, "cost": 900, "profit": 200},
+        ])
+
+    def test_cost_basis_survives_save_and_reload(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+
+        data = truckerspil_app.load_game_state()
+        reloaded = truckerspil_app.build_players(data["players"])["Player 1"]
+
+        self.assertEqual(data["players"]["Player 1"]["cost_basis"][0], [900, "Tokyo"])
+        self.assertEqual(reloaded.basis[0], 900)
+        self.assertEqual(reloaded.pnl.items, truckerspil_app.players["Player 1"].pnl.items)
+
+    def test_hard_memory_budget_archives_old_log_entries_but_export_keeps_them(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.post("/buy", data={"player": "Player 1", "item": "Sake"})
+        truckerspil_app.LOG_KEEP_ENTRIES = 3    # would split a text/record pair, so keeps 4
+        self.addCleanup(setattr, truckerspil_app, "LOG_KEEP_ENTRIES", 2000)
+
+        with truckerspil_app.state_lock:
+            actions = truckerspil_app.enforce_memory_budget("hard")
+
+        self.assertIn("log_entries_archived:0", actions)
+        truckerspil_app.LOG_KEEP_ENTRIES = 2
+        with truckerspil_app.state_lock:
+            actions = truckerspil_app.enforce_memory_budget("hard")
+
+        self.assertIn("log_entries_archived:2", actions)
+        log = truckerspil_app.players["Player 1"].transaction_log
+        self.assertEqual(len(log), 2)
+        self.assertIn("Købte Sake", log[0])
+        response = self.client.get("/admin/export?format=ndjson&player=Player%201")
+        money = [json.loads(line)["money"] for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(money, [9100, 5100])
+
+    def test_archived_rows_follow_renames_and_are_dropped_on_reset(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.post("/buy", data={"player": "Player 1", "item": "Sake"})
+        with truckerspil_app.state_lock:
+            truckerspil_app.archive_transaction_logs(keep=2)
+
+        self.client.post("/rename_player", data={"old_name": "Player 1", "new_name": "Aiko"})
+        self.client.post("/delete_player", data={"delete_player_name": "Aiko"})
+        rows = [json.loads(line) for line in
+                self.client.get("/admin/export").get_data(as_text=True).splitlines()]
+        self.assertEqual([r["money"] for r in rows], [9100])
+        self.assertTrue(rows[0]["player"].startswith("Aiko (deleted "))
+
+        self.client.post("/reset_game")
+        response = self.client.get("/admin/export?player=Player%201")
+        self.assertEqual(response.get_data(as_text=True), "")
+
+    def test_batch_rename_and_delete_relabel_archived_rows(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.post("/buy", data={"player": "Player 2", "item": "Sake"})
+        with truckerspil_app.state_lock:
+            truckerspil_app.archive_transaction_logs(keep=0)
+
+        response = self.client.post("/admin/batch", json=[
+            {"op": "rename_player", "player": "Player 1", "new_name": "Aiko"},
+            {"op": "add_player", "player": "Player 1"},
+            {"op": "delete_player", "player": "Player 2"},
+            {"op": "add_player", "player": "Player 2"},
+        ])
+        self.assertEqual(response.status_code, 200)
+
+        def exported(query):
+            body = self.client.get("/admin/export" + query).get_data(as_text=True)
+            return [(r["player"], r["entry"]) for r in map(json.loads, body.splitlines())]
+
+        self.assertEqual(exported("?player=Aiko"), [("Aiko", "Købte Nudler for ¥900 i Tokyo.")])
+        self.assertEqual(exported("?player=Player%201"), [("Player 1", "")])
+        self.assertEqual(exported("?player=Player%202"), [("Player 2", "")])
+        self.assertIn("Købte Sake for ¥4000 i Tokyo.",
+                      [entry for player, entry in exported("") if player.startswith("Player 2 (deleted ")])
+
+    def test_export_running_while_logs_are_archived_has_no_duplicates(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.post("/buy", data={"player": "Player 1", "item": "Sake"})
+        with truckerspil_app.state_lock:
+            truckerspil_app.archive_transaction_logs(keep=2)
+
+        response = self.client.get("/admin/export?player=Player%201")
+        with truckerspil_app.state_lock:
+            truckerspil_app.archive_transaction_logs(keep=0)
+        money = [json.loads(line)["money"] for line in response.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(money, [9100, 5100])
+
+    def test_archive_rows_are_dropped_if_the_trimmed_state_never_got_saved(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        saved = truckerspil_app.BACKUP_FILE.read_bytes()
+        with truckerspil_app.state_lock:
+            truckerspil_app.archive_transaction_logs(keep=0)
+
+        # Crash before game_state.json was rewritten, then restart
+        truckerspil_app.BACKUP_FILE.write_bytes(saved)
+        data = truckerspil_app.load_game_state()
+        truckerspil_app.players = truckerspil_app.build_players(data["players"])
+        truckerspil_app.log_archive_batch = data["log_archive_batch"]
+        truckerspil_app.drop_unsaved_archive_rows()
+        truckerspil_app.publish_snapshot()
+
+        body = self.client.get("/admin/export?player=Player%201").get_data(as_text=True)
+        self.assertEqual([json.loads(line)["money"] for line in body.splitlines()], [9100])
+
+    def test_archiving_with_keep_zero_moves_whole_log(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+
+        with truckerspil_app.state_lock:
+            moved = truckerspil_app.archive_transaction_logs(keep=0)
+
+        self.assertEqual(moved, 2)
+        self.assertEqual(truckerspil_app.players["Player 1"].transaction_log, [])
+
+    def test_admin_memory_reports_breakdown(self):
+        self.client.post("/buy", data={"player": "Player 1", "item": "Nudler"})
+        self.client.get("/")
+
+        report = self.client.get("/admin/memory").get_json()
+
+        # Cached templates only, not the Jinja environment / Flask app behind them
+        self.assertLess(report["sections"]["template_cache"], 50_000)
+
+        self.assertGreater(report["sections"]["transaction_logs"], 0)
+        self.assertEqual(report["players"]["Player 1"]["log_entries"], 2)
+        self.assertIn("history", report["sections"])
+        self.assertFalse(report["tracemalloc"]["enabled"])
+
+    def test_ws_buy_and_sell_reply_with_diffs(self):
+        reply = truckerspil_app.handle_ws_command("Player 1", {"id": 7, "op": "buy", "item": "Nudler"})
+
+        self.assertEqual(reply["id"], 7)
+        self.assertTrue(reply["ok"])
+        self.assertEqual(reply["money"], 9100)
+        self.assertEqual(reply["slots"], {"1": "Nudler"})
+        self.assertEqual(reply["log"], ["Købte Nudler for ¥900 i Tokyo."])
+        self.assertNotIn("capacity", reply)
+
+        truckerspil_app.selected_city = "Osaka"
+        reply = truckerspil_app.handle_ws_command("Player 1", {"op": "sell", "space": 1})
+
+        self.assertEqual(reply["money"], 10200)
+        self.assertEqual(reply["slots"], {"1": ""})
+        self.assertEqual(truckerspil_app.load_game_state()["players"]["Player 1"]["money"], 10200)
+
+    def test_ws_upgrade_reports_capacity_and_refusals_carry_message(self):
+        truckerspil_app.selected_city = truckerspil_app.UPGRADE_CITY
+
+        reply = truckerspil_app.handle_ws_command("Player 2", {"op": "upgrade"})
+
+        self.assertEqual((reply["capacity"], reply["upgrade_cost"]), (3, 12500))
+        self.assertEqual(reply["slots"], {"3": ""})
+        refused = truckerspil_app.handle_ws_command("Player 2", {"op": "buy", "item": "Nudler"})
+        self.assertFalse(refused["ok"])
+        self.assertEqual(refused["message"], "Varen blev ikke fundet.")
+
+    def test_ws_rejects_malformed_item_and_space(self):
+        for msg in ({"op": "buy", "item": ["Nudler"]}, {"op": "buy", "item": {"x": 1}},
+                    {"op": "sell", "space": [1]}, {"op": "clear", "space": None}):
+            reply = truckerspil_app.handle_ws_command("Player 1", msg)
+            self.assertEqual(reply, {"id": None, "ok": False, "message": "Ugyldig besked."})
+        self.assertEqual(truckerspil_app.players["Player 1"].money, 10000)
+
+    def test_admin_city_switch_returns_only_the_price_editor(self):
+        response = self.client.post("/admin/city", data={"city": "Osaka"})
+
+        html = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Priser i Osaka", html)
+        self.assertNotIn("Adminpanel", html)
+        self.assertEqual(truckerspil_app.selected_city, "Osaka")
+        self.assertEqual(self.client.post("/admin/city", data={"city": "Atlantis"}).status_code, 400)
+
+    def test_player_page_lists_players_from_the_published_snapshot(self):
+        truckerspil_app.players["Ghost"] = truckerspil_app.new_player()   # not yet published
+
+        html = self.client.get("/p/Player 2").get_data(as_text=True)
+
+        self.assertIn("/p/Player%204", html)
+        self.assertNotIn("Ghost", html)
+
 
 if __name__ == "__main__":
     unittest.main()